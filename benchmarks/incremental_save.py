@@ -0,0 +1,83 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare saving a scheme by building a new StyleGenerator from the whole
+StylesModel every time against patching the cached tree of the last save
+with the styles changed since, after a single edit and after no edit. Both
+go through save_styles, the way MainWindow._save_file saves.
+
+This needs Gtk for the StylesModel; suite.py times the same saves headless
+as save_tree and save_edit.
+
+Usage: python benchmarks/incremental_save.py [languages] [styles_per_language]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.styles import GThemerRow
+from lib.styles_model import StylesModel
+from lib.style_generator import save_styles
+
+from synthetic import synthetic_catalog, synthetic_styles, language_styles
+
+INFO = {'id': "bench", 'name': "Benchmark", 'author': "GThemer",
+        'description': "Synthetic scheme", 'version': "1.0"}
+
+def synthetic_model(languages):
+	model = StylesModel()
+	for title, rows in languages:
+		model.add_styles(title, rows)
+	model.take_changes()
+	return model
+
+def full_save(model, filename):
+	return save_styles(model, filename, INFO)
+
+def incremental_save(model, generator, filename):
+	return save_styles(model, filename, INFO, generator, INFO)
+
+def timed(function, *args):
+	start = time.time()
+	function(*args)
+	return time.time() - start
+
+if __name__ == '__main__':
+	language_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+	per_language = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+	catalog = synthetic_catalog(language_count, per_language)
+	languages = language_styles(catalog, synthetic_styles(catalog))
+	model = synthetic_model(languages)
+	title, rows = languages[0]
+	directory = tempfile.mkdtemp(prefix="gthemer-bench-")
+	try:
+		filename = os.path.join(directory, "scheme.xml")
+		full_time = timed(full_save, model, filename)
+		generator = full_save(model, filename)
+		model.set_value(model.style_iter(title, rows[0][0]), GThemerRow.index_of('background_data'), '#000000')
+		edit_time = timed(incremental_save, model, generator, filename)
+		noop_time = timed(incremental_save, model, generator, filename)
+	finally:
+		shutil.rmtree(directory)
+	print("{} languages x {} styles:".format(language_count, per_language))
+	print("  full save:             {:10.3f}ms".format(full_time * 1000))
+	print("  incremental, 1 edit:   {:10.3f}ms".format(edit_time * 1000))
+	print("  incremental, no edits: {:10.3f}ms".format(noop_time * 1000))
@@ -0,0 +1,85 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Time every step of the schema upgrade of a database created with the
+original schema and filled with a synthetic catalog, then check that the
+hot queries are answered from indexes.
+
+Exits with status 1 if the plan of a hot query scans a whole table.
+
+Usage: python benchmarks/migrations.py [languages] [styles_per_language]
+"""
+
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib import stylesdb
+from lib.stylesdb import GThemerDB
+
+from synthetic import synthetic_catalog
+
+def create_original(filename, catalog):
+	'''
+	Create a database with the schema GThemer started with, before any of
+	the SCHEMA_UPGRADES.
+	'''
+	conn = sqlite3.connect(filename)
+	for script in (stylesdb.CREATE_TABLE_LANGUAGES, stylesdb.CREATE_TABLE_STYLE_SCHEMES,
+	               stylesdb.CREATE_TABLE_FORMATS, stylesdb.CREATE_TABLE_GLOBALS):
+		conn.executescript(script)
+	conn.executemany("INSERT INTO languages (scheme, title) VALUES (?, ?);",
+	                 [(scheme, title) for scheme, title, _ in catalog])
+	for lang_seq_id, (_, __, style_ids) in enumerate(catalog, 1):
+		conn.executemany("INSERT INTO style_schemes (lang_seq_id, style) VALUES (?, ?);",
+		                 [(lang_seq_id, style) for style in style_ids])
+	conn.execute("INSERT INTO formats (style_seq_id, foreground, bold) SELECT style_seq_id, '#1a2b3c', style_seq_id % 2 FROM style_schemes;")
+	conn.executemany("INSERT INTO globals (scheme) VALUES (?);", [(style,) for style in GThemerDB.global_styles])
+	conn.commit()
+	conn.close()
+
+if __name__ == '__main__':
+	languages = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+	styles = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+	catalog = synthetic_catalog(languages, styles)
+	directory = tempfile.mkdtemp(prefix="gthemer-bench-")
+	try:
+		filename = os.path.join(directory, "original.db")
+		create_original(filename, catalog)
+		start = time.time()
+		db = GThemerDB(filename, languages=catalog)
+		elapsed = time.time() - start
+		print("Upgrading {} languages x {} styles: {:.3f}s".format(languages, styles, elapsed))
+		db.cursor.execute("SELECT version, seconds FROM schema_version ORDER BY version;")
+		for record in db.cursor.fetchall():
+			print("  step {}: {:8.3f}s".format(record['version'], record['seconds']))
+		for name, query, params in stylesdb.HOT_QUERIES:
+			if query.lstrip().startswith('SELECT'):
+				start = time.time()
+				db.cursor.execute(query, params).fetchall()
+				print("  {:24} {:8.3f}ms".format(name, (time.time() - start) * 1000))
+		scans = db.full_scans()
+		for name, detail in scans:
+			print("full scan in {}: {}".format(name, detail))
+		db.conn.close()
+	finally:
+		shutil.rmtree(directory)
+	sys.exit(1 if scans else 0)
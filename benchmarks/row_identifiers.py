@@ -0,0 +1,77 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare recovering style ids from the display markup with Pango.parse_markup
+against reading the style_id column, over every style row of a StylesModel.
+
+Usage: python benchmarks/row_identifiers.py [styles]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gi.repository import Pango
+
+from lib.styles import GThemerRow
+from lib.styles_model import StylesModel
+
+from synthetic import synthetic_catalog, synthetic_styles, language_styles
+
+# PER_LANGUAGE - Styles per language of the synthetic catalog.
+PER_LANGUAGE = 50
+
+def build_model(count):
+	catalog = synthetic_catalog(max(1, count // PER_LANGUAGE), PER_LANGUAGE)
+	model = StylesModel()
+	for title, rows in language_styles(catalog, synthetic_styles(catalog)):
+		model.add_styles(title, rows)
+	return model
+
+def iter_style_rows(model):
+	lang_iter = model.iter_children(None)
+	while lang_iter is not None:
+		child_iter = model.iter_children(lang_iter)
+		while child_iter is not None:
+			yield child_iter
+			child_iter = model.iter_next(child_iter)
+		lang_iter = model.iter_next(lang_iter)
+
+def ids_from_markup(model):
+	column = GThemerRow.index_of('definition')
+	for child_iter in iter_style_rows(model):
+		markup = model.get_value(child_iter, column)
+		_, __, style_id, ___ = Pango.parse_markup(markup, len(markup), "\0")
+
+def ids_from_column(model):
+	column = GThemerRow.index_of('style_id')
+	for child_iter in iter_style_rows(model):
+		style_id = model.get_value(child_iter, column)
+
+def timed(func, model):
+	start = time.time()
+	func(model)
+	return time.time() - start
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+	model = build_model(count)
+	rows = sum(1 for _ in iter_style_rows(model))
+	print("Resolving {} style ids".format(rows))
+	print("  Pango.parse_markup: {:8.3f}s".format(timed(ids_from_markup, model)))
+	print("  style_id column:    {:8.3f}s".format(timed(ids_from_column, model)))
@@ -0,0 +1,104 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare the slotted, list-backed GThemerRow against the original dict-backed
+row: bytes allocated per row and the time to build a row from a TreeStore
+row, read a few cells, look up column indices and convert it back.
+
+Usage: python benchmarks/row_record.py [rows]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.styles import GThemerRow
+
+class DictRow:
+	'''
+	The dict-backed GThemerRow as it was before it was slotted.
+	'''
+	row_keys = GThemerRow.row_keys
+	str_keys = GThemerRow.str_keys
+
+	def __init__(self, *args, **kwargs):
+		self.row_dict = {}
+		if args:
+			self.row_dict = {key:args[idx] for idx, key in enumerate(self.row_keys)}
+		elif kwargs:
+			self.row_dict = {key:kwargs.get(key, None) for key in self.row_keys}
+		else:
+			self.row_dict = {key:'' if key in self.str_keys else False for key in self.row_keys}
+
+	def __iter__(self):
+		for item in self.get_row():
+			yield item
+
+	def __setitem__(self, key, value):
+		if key not in self.row_keys:
+			raise KeyError("{} is not a valid key in GThemerRow.".format(repr(key)))
+		self.row_dict[key] = value
+
+	def __getitem__(self, key):
+		return self.row_dict[key]
+
+	def get_row(self):
+		return [self.row_dict[key] for key in self.row_keys]
+
+	def index_of(self, column):
+		return list(self.row_keys).index(column)
+
+def row_size(row):
+	'''
+	Returns the bytes allocated for *row* itself and its container, not
+	counting the cell values which both layouts share.
+	'''
+	size = sys.getsizeof(row)
+	if isinstance(row, DictRow):
+		size += sys.getsizeof(row.__dict__) + sys.getsizeof(row.row_dict)
+	else:
+		size += sys.getsizeof(row.values)
+	return size
+
+def round_trip(row_class, from_row, model_rows):
+	skeleton = row_class()
+	start = time.time()
+	for values in model_rows:
+		row = from_row(values)
+		row['bold'] = not row['bold']
+		markup = row['definition'] + row['style_id']
+		column = skeleton.index_of('background_display') + skeleton.index_of('strikethrough')
+		values = row.get_row()
+	return time.time() - start
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+	model_rows = []
+	for idx in xrange(count):
+		row = list(GThemerRow.default_values)
+		row[GThemerRow.index_of('definition')] = "<span>lang:style{}</span>".format(idx)
+		row[GThemerRow.index_of('style_id')] = "lang:style{}".format(idx)
+		model_rows.append(row)
+
+	dict_time = round_trip(DictRow, lambda values: DictRow(*values), model_rows)
+	slot_time = round_trip(GThemerRow, GThemerRow.from_row, model_rows)
+	dict_size = row_size(DictRow(*model_rows[0]))
+	slot_size = row_size(GThemerRow.from_row(model_rows[0]))
+	print("{} rows".format(count))
+	print("  dict-backed: {:6d} bytes/row {:8.3f}us/row".format(dict_size, dict_time / count * 1e6))
+	print("  slotted:     {:6d} bytes/row {:8.3f}us/row".format(slot_size, slot_time / count * 1e6))
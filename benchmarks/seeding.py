@@ -0,0 +1,73 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare seeding a new GThemerDB row by row (one INSERT per language and two
+subquery INSERTs per style) against the bulk GThemerDB.seed path.
+
+Usage: python benchmarks/seeding.py [languages] [styles_per_language]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.stylesdb import GThemerDB
+
+from synthetic import synthetic_catalog
+
+def seed_row_by_row(db, catalog):
+	'''
+	The original GThemerDB._init_default insert pattern.
+	'''
+	for scheme, title, style_ids in catalog:
+		db.new_language(scheme, title)
+		for style in style_ids:
+			db.new_style(scheme, style)
+			db.new_format(scheme, style)
+	db.conn.commit()
+
+def seed_bulk(db, catalog):
+	db.seed(catalog)
+
+def run(name, seeder, catalog, directory):
+	filename = os.path.join(directory, name + ".db")
+	db = GThemerDB(filename, languages=[])
+	start = time.time()
+	seeder(db, catalog)
+	elapsed = time.time() - start
+	db.cursor.execute("SELECT COUNT(*) FROM formats;")
+	count = db.cursor.fetchone()[0]
+	db.conn.close()
+	return elapsed, count
+
+if __name__ == '__main__':
+	languages = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+	styles = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+	catalog = synthetic_catalog(languages, styles)
+	directory = tempfile.mkdtemp(prefix="gthemer-bench-")
+	try:
+		row_time, row_count = run("row_by_row", seed_row_by_row, catalog, directory)
+		bulk_time, bulk_count = run("bulk", seed_bulk, catalog, directory)
+	finally:
+		shutil.rmtree(directory)
+	assert row_count == bulk_count == languages * styles
+	print("Seeding {} languages x {} styles".format(languages, styles))
+	print("  row by row: {:8.3f}s".format(row_time))
+	print("  bulk:       {:8.3f}s ({:.1f}x)".format(bulk_time, row_time / bulk_time))
@@ -0,0 +1,87 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare the throughput and peak memory of saving a synthetic scheme by
+adding every style to the tree and serializing it to one string, the way
+save_file used to, against streaming the styles straight to the file.
+
+Each run happens in a child process so its peak resident size is its own.
+
+Usage: python benchmarks/streaming_save.py [styles...]
+"""
+
+import os
+import sys
+import resource
+import subprocess
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree
+
+from lib.style_generator import StyleGenerator
+
+from synthetic import synthetic_catalog, synthetic_styles
+
+# PER_LANGUAGE - Styles per language of the synthetic catalog.
+PER_LANGUAGE = 100
+
+def save_tree(generator, filename, catalog):
+	written = 0
+	for name, config in synthetic_styles(catalog):
+		generator.add_style(name, config)
+		written += 1
+	with open(filename, 'w') as fp:
+		fp.write(etree.tostring(generator.tree, pretty_print=True))
+	return written
+
+def save_stream(generator, filename, catalog):
+	return generator.save_file(filename, synthetic_styles(catalog))
+
+def run(mode, count):
+	catalog = synthetic_catalog(max(1, count // PER_LANGUAGE), PER_LANGUAGE)
+	generator = StyleGenerator()
+	generator.add_info("bench", "Benchmark", author="GThemer", version="1.0")
+	fd, filename = tempfile.mkstemp(suffix=".xml")
+	os.close(fd)
+	try:
+		base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		start = time.time()
+		written = (save_tree if mode == 'tree' else save_stream)(generator, filename, catalog)
+		elapsed = time.time() - start
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base
+	finally:
+		os.remove(filename)
+	print("{} {} {} {}".format(mode, elapsed, peak, written))
+
+if __name__ == '__main__':
+	if len(sys.argv) == 4 and sys.argv[1] == '--run':
+		run(sys.argv[2], int(sys.argv[3]))
+		sys.exit(0)
+	sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 500000]
+	for count in sizes:
+		results = {}
+		for mode in ('tree', 'stream'):
+			output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--run', mode, str(count)])
+			_, elapsed, peak, written = output.split()
+			results[mode] = (float(elapsed), int(peak))
+		written = int(written)
+		print("{:>7} styles, {} set:".format(count, written))
+		for mode, (elapsed, peak) in sorted(results.iteritems(), reverse=True):
+			print("  {:6}  {:8.3f}s  {:9.0f} styles/s  peak +{:7.1f}MB".format(
+				mode, elapsed, written / elapsed, peak / 1024.0))
@@ -0,0 +1,114 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare the columnar GThemerStyles against the original dict-of-dicts layout
+on a synthetic catalog: bytes held by the styles and the time to set and get
+every style.
+
+The columnar layout trades time for memory: it holds a fraction of the bytes,
+but a get builds a new dict from the table and a set packs the attributes
+into it. With few styles per language both are slower than the dict update
+and copy they replace; the old layout checked the style against a list of
+the language's keys, so with a few hundred styles per language it is the
+slower one.
+
+Usage: python benchmarks/styles_storage.py [languages] [styles per language]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.styles import GThemerStyles, LanguageUndefinedError, StyleUndefinedError
+
+from synthetic import synthetic_catalog
+
+class DictStyles:
+	'''
+	The dict-of-dicts GThemerStyles layout as it was before the StyleTable,
+	with the same lookups and copies as its set_style and get_style.
+	'''
+	def __init__(self, catalog):
+		self.styles = {}
+		for lang, name, style_ids in catalog:
+			self.styles[lang] = {
+				'styles': {style: {attr: None for attr in GThemerStyles.style_attrs} for style in style_ids},
+				'name': name,
+				'scheme': lang,
+			}
+
+	def set_style(self, language, style_name, style_config):
+		if language not in self.styles:
+			raise LanguageUndefinedError("{} is not defined!".format(repr(language)))
+		if style_name not in self.styles[language]['styles'].keys():
+			raise StyleUndefinedError("style: {} is not defined for language: {}!".format(repr(style_name), repr(language)))
+		self.styles[language]['styles'][style_name].update(style_config)
+
+	def get_style(self, language, style_name):
+		if language not in self.styles:
+			raise LanguageUndefinedError("{} is not defined!".format(repr(language)))
+		if style_name not in self.styles[language]['styles'].keys():
+			raise StyleUndefinedError("style: {} is not defined for language: {}!".format(repr(style_name), repr(language)))
+		return dict(self.styles[language]['styles'][style_name])
+
+def deep_size(obj, seen=None):
+	'''
+	Returns the bytes allocated for *obj* and everything it references.
+	'''
+	seen = set() if seen is None else seen
+	if id(obj) in seen:
+		return 0
+	seen.add(id(obj))
+	size = sys.getsizeof(obj)
+	if isinstance(obj, dict):
+		size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.iteritems())
+	elif isinstance(obj, (list, tuple)):
+		size += sum(deep_size(item, seen) for item in obj)
+	elif hasattr(obj, '__slots__'):
+		size += sum(deep_size(getattr(obj, name), seen) for name in obj.__slots__)
+	elif hasattr(obj, '__dict__'):
+		size += deep_size(obj.__dict__, seen)
+	return size
+
+def timed(styles, catalog):
+	config = {'foreground': "#1a2b3c", 'bold': True}
+	start = time.time()
+	for lang, _, style_ids in catalog:
+		for style in style_ids[::10]:
+			styles.set_style(lang, style, config)
+	set_time = time.time() - start
+	start = time.time()
+	for lang, _, style_ids in catalog:
+		for style in style_ids:
+			styles.get_style(lang, style)
+	return set_time, time.time() - start
+
+if __name__ == '__main__':
+	languages = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+	per_language = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+	catalog = synthetic_catalog(languages, per_language)
+	count = languages * per_language
+	print("{} languages, {} styles, one in ten set".format(languages, count))
+	for label, layout in (("dict-of-dicts", DictStyles), ("columnar", GThemerStyles)):
+		# One layout at a time, so the garbage collector never walks the other.
+		styles = layout(catalog)
+		set_time, get_time = timed(styles, catalog)
+		size = deep_size(styles.styles if isinstance(styles, DictStyles) else (styles.languages, styles.table))
+		print("  {:14} {:10d} bytes {:8.3f}us/set {:8.3f}us/get".format(
+			label, size, set_time / (count / 10) * 1e6, get_time / count * 1e6))
+		del styles
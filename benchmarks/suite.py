@@ -0,0 +1,275 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Headless benchmark suite over a synthetic scheme of N languages x M styles:
+parsing, seeding and querying the database, GThemerStyles, computing the
+cells of the styles tree and the save paths.
+
+Nothing imports Gtk: the synthetic catalog stands in for the GtkSource one
+and StandInModel for the StylesModel, so it runs without a display. The
+best of --repeat runs of each benchmark is kept, and the results can be
+written as JSON and compared with an earlier run.
+
+Usage: python benchmarks/suite.py [-l LANGUAGES] [-s STYLES] [-r REPEAT]
+                                  [--json FILE] [--compare FILE] [NAME...]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import tempfile
+import argparse
+import platform
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree
+
+from lib.styles import GThemerStyles, GThemerRow, StyleTable
+from lib.stylesdb import GThemerDB
+from lib.style_generator import StyleGenerator
+from lib.markup import style_cell, markup_cache
+
+from synthetic import synthetic_catalog, synthetic_styles, write_scheme
+
+# UPDATES - How many styles the update benchmarks edit.
+UPDATES = 1000
+
+class StandInModel:
+	'''
+	Holds the styles of a scheme the way StylesModel does, a StyleTable slot
+	per style, without being a Gtk.TreeModel.
+	'''
+
+	def __init__(self, styles):
+		self.table = StyleTable()
+		self.rows = []
+		for name, config in styles:
+			slot = self.table.add()
+			self.table.set(slot, config)
+			self.rows.append((name, slot))
+
+	def cells(self, row):
+		'''
+		Returns the values StylesModel.do_get_value gives for the columns of
+		*row*.
+		'''
+		name, slot = self.rows[row]
+		return [style_cell(key, name, self.table, slot) for key in GThemerRow.row_keys]
+
+	def iter_styles(self):
+		for name, slot in self.rows:
+			yield name, self.table.get(slot)
+
+
+class Suite:
+	'''
+	The benchmarks, run in order on one synthetic scheme. Each ``bench_*``
+	method times itself and returns the seconds it took.
+	'''
+
+	def __init__(self, languages, per_language, directory):
+		self.directory = directory
+		self.catalog = synthetic_catalog(languages, per_language)
+		self.styles = list(synthetic_styles(self.catalog))
+		self.scheme = os.path.join(directory, "scheme.xml")
+		write_scheme(self.scheme, self.catalog)
+		self.db = GThemerDB(os.path.join(directory, "suite.db"), languages=self.catalog)
+		self.runs = 0
+
+	# names - The benchmarks, in the order they run.
+	names = ('parse_file', 'db_seed', 'db_iter_styles', 'db_update_format', 'db_update_formats',
+	         'styles_set', 'styles_get', 'styles_iter_set', 'row_markup',
+	         'save_tree', 'save_stream', 'save_patch', 'save_edit')
+
+	def new_path(self, name):
+		self.runs += 1
+		return os.path.join(self.directory, "{}-{}".format(self.runs, name))
+
+	def bench_parse_file(self):
+		start = time.time()
+		StyleGenerator().parse_file(self.scheme)
+		return time.time() - start
+
+	def bench_db_seed(self):
+		filename = self.new_path("seed.db")
+		start = time.time()
+		db = GThemerDB(filename, languages=self.catalog)
+		elapsed = time.time() - start
+		db.conn.close()
+		return elapsed
+
+	def bench_db_iter_styles(self):
+		start = time.time()
+		for record in self.db.iter_styles():
+			pass
+		return time.time() - start
+
+	def _updates(self):
+		return [(name.split(':')[0], name, config) for name, config in self.styles if ':' in name][:UPDATES]
+
+	def bench_db_update_format(self):
+		updates = self._updates()
+		start = time.time()
+		for language, name, config in updates:
+			self.db.update_format(language, name, config)
+		return time.time() - start
+
+	def bench_db_update_formats(self):
+		updates = self._updates()
+		start = time.time()
+		self.db.update_formats(updates)
+		return time.time() - start
+
+	def new_theme(self):
+		theme = GThemerStyles(self.catalog)
+		for name, config in self.styles:
+			if ':' in name:
+				theme.set_style(name.split(':')[0], name, config)
+			else:
+				theme.set_global_styles(name, config)
+		return theme
+
+	def bench_styles_set(self):
+		start = time.time()
+		self.new_theme()
+		return time.time() - start
+
+	def bench_styles_get(self):
+		theme = self.new_theme()
+		start = time.time()
+		for language, _, __ in self.catalog:
+			theme.get_styles(language)
+		return time.time() - start
+
+	def bench_styles_iter_set(self):
+		theme = self.new_theme()
+		start = time.time()
+		for style in theme.iter_set_styles():
+			pass
+		return time.time() - start
+
+	def bench_row_markup(self):
+		model = StandInModel(self.styles)
+		markup_cache.clear()
+		start = time.time()
+		for row in xrange(len(model.rows)):
+			model.cells(row)
+		return time.time() - start
+
+	def new_generator(self, model):
+		generator = StyleGenerator()
+		generator.add_info("suite", "Suite", version="1.0")
+		for name, config in model.iter_styles():
+			generator.add_style(name, config)
+		return generator
+
+	def bench_save_tree(self):
+		model = StandInModel(self.styles)
+		start = time.time()
+		self.new_generator(model).save_file(self.new_path("tree.xml"))
+		return time.time() - start
+
+	def bench_save_stream(self):
+		model = StandInModel(self.styles)
+		start = time.time()
+		generator = StyleGenerator()
+		generator.add_info("suite", "Suite", version="1.0")
+		generator.save_file(self.new_path("stream.xml"), model.iter_styles())
+		return time.time() - start
+
+	def bench_save_patch(self):
+		generator = self.new_generator(StandInModel(self.styles))
+		changes = self.styles[::100]
+		start = time.time()
+		for name, config in changes:
+			generator.update_style(name, dict(config, background="#000000"))
+		generator.save_file(self.new_path("patch.xml"))
+		return time.time() - start
+
+	def bench_save_edit(self):
+		# What MainWindow._save_file does after a single edit: patch the
+		# generator of the last save instead of building one like save_tree.
+		generator = self.new_generator(StandInModel(self.styles))
+		name, config = self.styles[len(self.styles) // 2]
+		start = time.time()
+		generator.update_style(name, dict(config, background="#000000"))
+		generator.save_file(self.new_path("edit.xml"))
+		return time.time() - start
+
+
+def run(args):
+	directory = tempfile.mkdtemp(prefix="gthemer-suite-")
+	try:
+		suite = Suite(args.languages, args.styles, directory)
+		names = args.names or suite.names
+		unknown = set(names) - set(suite.names)
+		if unknown:
+			sys.exit("unknown benchmarks: {}".format(", ".join(sorted(unknown))))
+		results = {}
+		for name in names:
+			best = min(getattr(suite, 'bench_' + name)() for _ in xrange(args.repeat))
+			results[name] = {'seconds': best, 'per_style_us': best * 1e6 / len(suite.styles)}
+		count = len(suite.styles)
+	finally:
+		shutil.rmtree(directory)
+	return {
+		'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+		'python': platform.python_version(),
+		'sqlite': sqlite3.sqlite_version,
+		'lxml': ".".join(str(part) for part in etree.LXML_VERSION),
+		'languages': args.languages,
+		'styles_per_language': args.styles,
+		'styles': count,
+		'repeat': args.repeat,
+		'results': results,
+	}
+
+def report(summary, previous=None):
+	print("{} languages x {} styles, {} styles set, best of {}".format(
+		summary['languages'], summary['styles_per_language'], summary['styles'], summary['repeat']))
+	for name in Suite.names:
+		if name not in summary['results']:
+			continue
+		result = summary['results'][name]
+		line = "  {:20} {:10.3f}ms {:8.2f}us/style".format(name, result['seconds'] * 1000, result['per_style_us'])
+		if previous is not None and name in previous['results']:
+			# Per style, so runs of different sizes compare too.
+			before = previous['results'][name]['per_style_us']
+			line += "  {:6.2f}x vs before".format(before / result['per_style_us'] if result['per_style_us'] else 0.0)
+		print(line)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Headless GThemer benchmarks.")
+	parser.add_argument('-l', '--languages', type=int, default=100)
+	parser.add_argument('-s', '--styles', type=int, default=50, help="styles per language")
+	parser.add_argument('-r', '--repeat', type=int, default=3)
+	parser.add_argument('--json', help="write the results to this file")
+	parser.add_argument('--compare', help="results of an earlier --json run to compare with")
+	parser.add_argument('names', nargs='*', help="benchmarks to run, all by default")
+	args = parser.parse_args()
+	previous = None
+	if args.compare:
+		with open(args.compare) as fp:
+			previous = json.load(fp)
+	summary = run(args)
+	report(summary, previous)
+	if args.json:
+		with open(args.json, 'w') as fp:
+			json.dump(summary, fp, indent=1, sort_keys=True)
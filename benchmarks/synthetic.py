@@ -0,0 +1,118 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Synthetic language catalogs and style schemes for the benchmarks.
+
+The catalog stands in for the one GtkSource provides, so nothing here
+needs a display. Schemes set their styles the way real ones tend to: most
+styles get a foreground from a small palette, few get a background, and
+bold and italic are far more common than underline and strikethrough.
+
+Usage: python benchmarks/synthetic.py languages styles_per_language OUTPUT.xml
+"""
+
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.stylesdb import GThemerDB
+from lib.style_generator import StyleGenerator
+
+# PALETTE_SIZE - How many distinct colors a scheme uses.
+PALETTE_SIZE = 24
+
+# ATTRIBUTE_RATES - The share of styles setting each attribute.
+ATTRIBUTE_RATES = (
+	('foreground', 0.7),
+	('background', 0.1),
+	('bold', 0.2),
+	('italic', 0.15),
+	('underline', 0.03),
+	('strikethrough', 0.01),
+)
+
+def synthetic_catalog(languages, per_language, style_format="lang{lang}:style{style}"):
+	'''
+	Returns (``list``) of *languages* ``(scheme, title, style_ids)`` tuples
+	with *per_language* styles each.
+
+	*style_format* (``str``) The style ids, formatted with the ``lang`` and
+		``style`` indices.
+	'''
+	return [("lang{}".format(lang), "Language {}".format(lang),
+	         tuple(style_format.format(lang=lang, style=style) for style in xrange(per_language)))
+	        for lang in xrange(languages)]
+
+def synthetic_styles(catalog, seed=0):
+	'''
+	Yield a ``(name, config)`` tuple for every global style and every style
+	of *catalog* that sets at least one attribute, the same ones for the
+	same *seed*.
+	'''
+	rng = random.Random(seed)
+	palette = ["#{:06x}".format(rng.randrange(0x1000000)) for _ in xrange(PALETTE_SIZE)]
+	def config():
+		style = {}
+		for attr, rate in ATTRIBUTE_RATES:
+			if rng.random() < rate:
+				style[attr] = rng.choice(palette) if attr in ('foreground', 'background') else rng.random() < 0.9
+		return style
+	names = list(GThemerDB.global_styles)
+	for _, __, style_ids in catalog:
+		names.extend(style_ids)
+	for name in names:
+		style = config()
+		if style:
+			yield name, style
+
+def language_styles(catalog, styles):
+	'''
+	Returns (``list``) of ``(title, [(name, config), ...])`` tuples, the
+	*styles* of each language of *catalog* in catalog order, the way
+	StylesModel groups them. Styles outside the catalog, like the globals,
+	are left out.
+
+	*styles* (``iterable``) of ``(name, config)`` tuples, see
+		:func:`synthetic_styles`.
+	'''
+	titles = {}
+	for _, title, style_ids in catalog:
+		for name in style_ids:
+			titles[name] = title
+	groups = dict((title, []) for _, title, __ in catalog)
+	for name, config in styles:
+		if name in titles:
+			groups[titles[name]].append((name, config))
+	return [(title, groups[title]) for _, title, __ in catalog]
+
+def write_scheme(filename, catalog, seed=0):
+	'''
+	Write a scheme setting the :func:`synthetic_styles` of *catalog*.
+
+	Returns (``int``) the number of styles written.
+	'''
+	generator = StyleGenerator()
+	generator.add_info("synthetic", "Synthetic", author="GThemer benchmarks",
+	                   description="{} languages".format(len(catalog)), version="1.0")
+	return generator.save_file(filename, synthetic_styles(catalog, seed))
+
+if __name__ == '__main__':
+	if len(sys.argv) != 4:
+		sys.exit(__doc__.strip().splitlines()[-1])
+	count = write_scheme(sys.argv[3], synthetic_catalog(int(sys.argv[1]), int(sys.argv[2])))
+	print("Wrote {} styles to {}".format(count, sys.argv[3]))
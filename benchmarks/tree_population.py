@@ -0,0 +1,89 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare loading a scheme into a StylesModel attached to a StylesTreeView one
+row at a time against the batched, view-detached add_styles path and the
+lazy add_lazy_group path, which only adds a placeholder per language until a
+group is expanded.
+
+Usage: python benchmarks/tree_population.py [styles...]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gi.repository import Gtk
+
+from lib.styles_model import StylesModel
+from lib.main_window import StylesTreeView, StylesTreeStoreInterface
+
+from synthetic import synthetic_catalog, synthetic_styles, language_styles
+
+# PER_LANGUAGE - Styles per language of the synthetic catalog.
+PER_LANGUAGE = 100
+
+class NoGlobals:
+	def iter_globals(self):
+		return []
+
+def new_interface():
+	view = StylesTreeView()
+	view._setup_columns()
+	store = StylesModel()
+	view.set_model(store)
+	window = Gtk.Window()
+	scrolled = Gtk.ScrolledWindow()
+	scrolled.add(view)
+	window.add(scrolled)
+	window.show_all()
+	return view, StylesTreeStoreInterface(store, NoGlobals())
+
+def load_row_by_row(view, interface, languages):
+	for language, rows in languages:
+		for style, row in rows:
+			interface.add_style(language, style, row)
+
+def load_batched(view, interface, languages):
+	with interface.detached(view):
+		for language, rows in languages:
+			interface.add_styles(language, rows)
+
+def load_lazy(view, interface, languages):
+	with interface.detached(view):
+		for language, rows in languages:
+			interface.add_lazy_group(language, rows)
+
+def timed(loader, languages):
+	view, interface = new_interface()
+	start = time.time()
+	loader(view, interface, languages)
+	while Gtk.events_pending():
+		Gtk.main_iteration()
+	return time.time() - start
+
+if __name__ == '__main__':
+	sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 50000]
+	for count in sizes:
+		catalog = synthetic_catalog(max(1, count // PER_LANGUAGE), PER_LANGUAGE)
+		languages = language_styles(catalog, synthetic_styles(catalog))
+		row_time = timed(load_row_by_row, languages)
+		batch_time = timed(load_batched, languages)
+		lazy_time = timed(load_lazy, languages)
+		print("{:>6} styles: row by row {:8.3f}s, batched {:8.3f}s ({:.1f}x), lazy {:8.3f}s ({:.1f}x)".format(
+			count, row_time, batch_time, row_time / batch_time, lazy_time, row_time / lazy_time))
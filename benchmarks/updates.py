@@ -0,0 +1,78 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare applying a palette to many styles with one committed
+GThemerDB.update_format call per style against a single batched
+GThemerDB.update_formats call.
+
+Usage: python benchmarks/updates.py [languages] [styles_per_language]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.stylesdb import GThemerDB
+
+from synthetic import synthetic_catalog
+
+# STYLE_FORMAT - A quote in the style names used to break the repr built queries.
+STYLE_FORMAT = "lang{lang}:it's{style}"
+
+def palette(catalog):
+	updates = []
+	for idx, (scheme, _, style_ids) in enumerate(catalog):
+		for style in style_ids:
+			updates.append((scheme, style, {'foreground': "#{:06x}".format(idx * 4099 % 0xffffff), 'bold': idx % 2 == 0}))
+	return updates
+
+def per_call(db, updates):
+	for language, style, config in updates:
+		db.update_format(language, style, config)
+
+def batched(db, updates):
+	db.update_formats(updates)
+
+def run(name, updater, catalog, directory):
+	db = GThemerDB(os.path.join(directory, name + ".db"), languages=catalog)
+	updates = palette(catalog)
+	start = time.time()
+	updater(db, updates)
+	elapsed = time.time() - start
+	db.cursor.execute("SELECT COUNT(*) FROM formats WHERE foreground IS NOT NULL;")
+	count = db.cursor.fetchone()[0]
+	db.conn.close()
+	return elapsed, count
+
+if __name__ == '__main__':
+	languages = int(sys.argv[1]) if len(sys.argv) > 1 else 25
+	per_language = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+	catalog = synthetic_catalog(languages, per_language, STYLE_FORMAT)
+	count = languages * per_language
+	directory = tempfile.mkdtemp(prefix="gthemer-bench-")
+	try:
+		call_time, call_count = run("per_call", per_call, catalog, directory)
+		batch_time, batch_count = run("batched", batched, catalog, directory)
+	finally:
+		shutil.rmtree(directory)
+	assert call_count == batch_count == count
+	print("Updating {} styles".format(count))
+	print("  update_format per style: {:8.3f}s".format(call_time))
+	print("  update_formats:          {:8.3f}s ({:.1f}x)".format(batch_time, call_time / batch_time))
@@ -0,0 +1,4 @@
+#!/bin/bash
+# Precompile the ui definitions into ui/gthemer.gresource, which GThemer
+# loads instead of the .glade files when it exists.
+cd "$(dirname "$0")/ui" && glib-compile-resources gthemer.gresource.xml --target=gthemer.gresource
@@ -1 +0,0 @@
-from lib.main_window import MainWindow
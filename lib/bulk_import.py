@@ -0,0 +1,133 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Import a whole directory of style-scheme xml files into a GThemerDB.
+
+Every file is parsed by StyleGenerator.parse_file in a pool of worker
+processes, and the parsed schemes are written to the database as themes in
+batched transactions from the calling process.
+"""
+
+import os
+import glob
+import time
+import multiprocessing
+
+from lib.style_generator import StyleGenerator
+
+def parse_scheme(filename):
+	'''
+	Parse a single scheme file, this runs in a worker process.
+
+	*filename* (``str``) xml styles-scheme filepath.
+
+	Returns (``dict``) with the ``filename``, the parsed ``info`` and
+	``styles``, the number of ``count`` styles, the ``seconds`` it took and the
+	``error`` message if the file couldn't be parsed.
+	'''
+	start = time.time()
+	result = {
+		'filename': filename,
+		'info': None,
+		'styles': None,
+		'count': 0,
+		'seconds': 0.0,
+		'error': None,
+	}
+	try:
+		info, styles = StyleGenerator().parse_file(filename)
+	except Exception as e:
+		result['error'] = "{}: {}".format(e.__class__.__name__, e)
+	else:
+		result['info'] = info
+		result['styles'] = styles
+		result['count'] = sum(len(config) if language == '__globals' else len(config['styles'])
+		                      for language, config in styles.iteritems())
+	result['seconds'] = time.time() - start
+	return result
+
+def import_directory(directory, db, processes=None, batch_size=50, report=None):
+	'''
+	Parse every ``*.xml`` scheme in *directory* and import it into *db*.
+
+	*directory* (``str``) containing the style-scheme files.
+
+	*db* (``GThemerDB``) to import the schemes into.
+
+	*processes* (``int``) is the size of the worker pool, ``None`` for one
+		worker per core.
+
+	*batch_size* (``int``) is the number of schemes written per transaction.
+
+	*report* (``callable``) is optionally called with each result ``dict``
+		(see :func:`parse_scheme`) once it has been parsed. Imported results
+		also get the number of ``skipped`` styles that aren't in *db*.
+
+	Returns (``list``) the result of every file.
+	'''
+	filenames = sorted(glob.glob(os.path.join(os.path.abspath(directory), '*.xml')))
+	results = []
+	batch = []
+
+	def flush():
+		skipped = db.import_themes((result['filename'], result['info'], result['styles']) for result in batch)
+		for result, missing in zip(batch, skipped):
+			result['skipped'] = missing
+			# The parsed styles aren't needed once they are in the database.
+			result['styles'] = None
+			if report is not None:
+				report(result)
+		del batch[:]
+
+	pool = multiprocessing.Pool(processes)
+	try:
+		for result in pool.imap_unordered(parse_scheme, filenames):
+			results.append(result)
+			if result['error'] is not None:
+				if report is not None:
+					report(result)
+				continue
+			batch.append(result)
+			if len(batch) >= batch_size:
+				flush()
+		if batch:
+			flush()
+	finally:
+		pool.close()
+		pool.join()
+	return results
+
+def format_result(result):
+	'''
+	Returns a one line summary of an import result.
+	'''
+	if result['error'] is not None:
+		return "FAILED {}: {}".format(result['filename'], result['error'])
+	rate = result['count'] / result['seconds'] if result['seconds'] else 0.0
+	return "{} styles in {:.3f}s ({:.0f} styles/s, {} skipped) {}".format(
+		result['count'], result['seconds'], rate, result.get('skipped', 0), result['filename'])
+
+
+if __name__ == '__main__':
+	import sys
+	from lib.stylesdb import GThemerDB
+	db = GThemerDB(sys.argv[2] if len(sys.argv) > 2 else os.path.expanduser('~/.gthemer/default.db'))
+	start = time.time()
+	def report(result):
+		print(format_result(result))
+	results = import_directory(sys.argv[1], db, report=report)
+	failed = sum(1 for result in results if result['error'] is not None)
+	print("Imported {} of {} files in {:.3f}s".format(len(results) - failed, len(results), time.time() - start))
@@ -0,0 +1,213 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Headless command line interface for GThemer.
+
+	gthemer build OUTPUT       write the styles saved in the database as a scheme
+	gthemer convert IN OUT     rewrite a scheme, keeping only known styles
+	gthemer validate FILE...   check schemes against the installed languages
+	gthemer import DIRECTORY   import a directory of schemes into the database
+
+Nothing in here imports Gtk or Pango, so it runs without a display. GtkSource
+is only imported to list the installed languages when their snapshot is
+missing or out of date.
+"""
+
+import os
+import sys
+import argparse
+
+from lib.stylesdb import GThemerDB, DEFAULT_DB_PATH
+from lib.language_catalog import CatalogUnavailableError
+from lib.style_generator import StyleGenerator, ParseError
+from lib.styles import GThemerStyles, LanguageUndefinedError, StyleUndefinedError
+
+def open_db(filename):
+	'''
+	Open the GThemerDB at *filename*, creating its directory if needed.
+	'''
+	directory = os.path.dirname(filename)
+	if directory and not os.path.exists(directory):
+		os.makedirs(directory)
+	return GThemerDB(filename)
+
+def new_generator(args, info=None):
+	'''
+	Returns a StyleGenerator whose info comes from *info* overridden by the
+	command line options.
+	'''
+	info = dict(info or {})
+	for key in ('id', 'name', 'author', 'version', 'description'):
+		value = getattr(args, key, None)
+		if value is not None:
+			info[key] = value
+	generator = StyleGenerator()
+	generator.add_info(info.get('id') or os.path.splitext(os.path.basename(args.output))[0],
+	                   info.get('name') or '',
+	                   author=info.get('author') or None,
+	                   description=info.get('description') or None,
+	                   version=info.get('version') or '1.0')
+	return generator
+
+def load_styles(theme, styles):
+	'''
+	Copy parsed *styles* into the GThemerStyles *theme*.
+
+	Returns (``list``) of problems with styles that couldn't be set.
+	'''
+	problems = []
+	for language, config in sorted(styles.iteritems()):
+		if language == '__globals':
+			for style_name, row in sorted(config.iteritems()):
+				if style_name not in theme.global_styles:
+					problems.append("unknown global style {}".format(repr(style_name)))
+					continue
+				theme.set_global_styles(style_name, {attr: row[attr] for attr in theme.style_attrs})
+			continue
+		for style_name, row in sorted(config['styles'].iteritems()):
+			try:
+				theme.set_style(language, style_name, {attr: row[attr] for attr in theme.style_attrs})
+			except LanguageUndefinedError:
+				problems.append("unknown language {} for style {}".format(repr(language), repr(style_name)))
+			except StyleUndefinedError:
+				problems.append("unknown style {}".format(repr(style_name)))
+	return problems
+
+def write_styles(generator, theme):
+	'''
+	Add every style of *theme* that has at least one attribute set.
+	'''
+	for global_name in sorted(theme.iter_global_names()):
+		config = theme.get_global_styles(global_name)
+		if any(value is not None for value in config.itervalues()):
+			generator.add_style(global_name, config)
+	for language, style_name, style in sorted(theme.iter_set_styles()):
+		generator.add_style(style_name, style)
+
+def build(args):
+	'''
+	Write the styles saved in the database as a scheme file.
+	'''
+	db = open_db(args.db)
+	theme = 0
+	if args.theme is not None:
+		theme = db.find_theme(args.theme)
+		if theme is None:
+			sys.stderr.write("no theme called {}\n".format(repr(args.theme)))
+			return 1
+	generator = new_generator(args)
+	count = generator.save_file(args.output, db.iter_scheme_styles(theme=theme))
+	print("Wrote {} styles to {}".format(count, args.output))
+	return 0
+
+def convert(args):
+	'''
+	Rewrite a scheme file, dropping styles that aren't installed.
+	'''
+	try:
+		info, styles = StyleGenerator().parse_file(args.input)
+	except ParseError as e:
+		sys.stderr.write("{}: {}\n".format(args.input, e))
+		return 1
+	theme = GThemerStyles()
+	for problem in load_styles(theme, styles):
+		sys.stderr.write("{}: dropping {}\n".format(args.input, problem))
+	generator = new_generator(args, info)
+	write_styles(generator, theme)
+	generator.save_file(args.output)
+	return 0
+
+def validate(args):
+	'''
+	Check every style of each scheme file against the installed languages.
+	'''
+	theme = GThemerStyles()
+	status = 0
+	for filename in args.files:
+		try:
+			info, styles = StyleGenerator().parse_file(filename)
+		except (ParseError, IOError) as e:
+			print("{}: {}".format(filename, e))
+			status = 1
+			continue
+		problems = load_styles(theme, styles)
+		for problem in problems:
+			print("{}: {}".format(filename, problem))
+		if problems:
+			status = 1
+		elif not args.quiet:
+			print("{}: ok".format(filename))
+	return status
+
+def import_schemes(args):
+	'''
+	Import a directory of scheme files into the database.
+	'''
+	from lib.bulk_import import import_directory, format_result
+	db = open_db(args.db)
+	report = None if args.quiet else (lambda result: sys.stdout.write(format_result(result) + "\n"))
+	results = import_directory(args.directory, db, processes=args.processes, report=report)
+	failed = sum(1 for result in results if result['error'] is not None)
+	print("Imported {} of {} files".format(len(results) - failed, len(results)))
+	return 1 if failed else 0
+
+def add_info_arguments(parser):
+	parser.add_argument('--id', help="scheme id, defaults to the output file name")
+	parser.add_argument('--name', help="scheme display name")
+	parser.add_argument('--author')
+	parser.add_argument('--version')
+	parser.add_argument('--description')
+
+def make_parser():
+	parser = argparse.ArgumentParser(prog='gthemer', description="Build gtksourceview style schemes.")
+	parser.add_argument('--db', default=DEFAULT_DB_PATH, help="styles database (default: %(default)s)")
+	commands = parser.add_subparsers(dest='command')
+
+	build_parser = commands.add_parser('build', help=build.__doc__.strip())
+	build_parser.add_argument('output')
+	build_parser.add_argument('--theme', help="name of a stored theme to build instead of the edited one")
+	add_info_arguments(build_parser)
+	build_parser.set_defaults(func=build)
+
+	convert_parser = commands.add_parser('convert', help=convert.__doc__.strip())
+	convert_parser.add_argument('input')
+	convert_parser.add_argument('output')
+	add_info_arguments(convert_parser)
+	convert_parser.set_defaults(func=convert)
+
+	validate_parser = commands.add_parser('validate', help=validate.__doc__.strip())
+	validate_parser.add_argument('files', nargs='+')
+	validate_parser.add_argument('-q', '--quiet', action='store_true', help="only report problems")
+	validate_parser.set_defaults(func=validate)
+
+	import_parser = commands.add_parser('import', help=import_schemes.__doc__.strip())
+	import_parser.add_argument('directory')
+	import_parser.add_argument('-j', '--processes', type=int, help="worker processes, defaults to one per core")
+	import_parser.add_argument('-q', '--quiet', action='store_true', help="only print the summary")
+	import_parser.set_defaults(func=import_schemes)
+	return parser
+
+def main(argv=None):
+	args = make_parser().parse_args(argv)
+	try:
+		return args.func(args)
+	except CatalogUnavailableError as e:
+		sys.stderr.write("gthemer: {}\n".format(e))
+		return 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,209 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+The catalog of languages and style ids known to GtkSource.
+
+Enumerating the GtkSource LanguageManager parses every .lang file on the
+system, so the result is kept in a snapshot file. The snapshot is keyed by the
+language-spec search path and the mtimes of the .lang files in it, so as long
+as nothing is installed or removed GtkSource is never imported at all.
+
+GtkSource searches the XDG data dirs and the data dir it was built with. The
+latter can't be known without GtkSource, so the directories GtkSource adds to
+the XDG ones are kept in the snapshot too.
+"""
+
+import os
+import glob
+import json
+import hashlib
+
+# snapshot_path - Default location of the language catalog snapshot.
+snapshot_path = os.path.expanduser('~/.gthemer/languages.snapshot')
+
+# snapshot_version - Bump whenever the snapshot layout changes.
+snapshot_version = 2
+
+def xdg_search_path():
+	'''
+	Returns the language-spec directories GtkSource derives from the
+	environment: the user data dir followed by the system data dirs.
+	'''
+	user_dir = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+	system_dirs = os.environ.get('XDG_DATA_DIRS') or '/usr/local/share/:/usr/share/'
+	data_dirs = [user_dir] + [path for path in system_dirs.split(os.pathsep) if path]
+	return [os.path.join(path, 'gtksourceview-3.0', 'language-specs') for path in data_dirs]
+
+
+class CatalogUnavailableError(Exception):
+	'''
+	This exception is raised when there is no valid snapshot and GtkSource
+	can't be imported to enumerate the languages.
+	'''
+
+
+class LanguageCatalog:
+	'''
+	Iterable of ``(scheme, title, style_ids)`` tuples for every usable
+	GtkSource language, backed by an on-disk snapshot.
+	'''
+
+	def __init__(self, path=snapshot_path, search_path=None):
+		'''
+		*path* (``str``) is the snapshot file, ``None`` to never persist it.
+
+		*search_path* (``list``) of language-spec directories, ``None`` for
+			the ones GtkSource searches by default.
+		'''
+		self.path = path
+		self.search_path = list(search_path) if search_path is not None else None
+		self._languages = None
+
+	def __iter__(self):
+		return iter(self.languages())
+
+	def __len__(self):
+		return len(self.languages())
+
+	def languages(self):
+		'''
+		Returns the list of ``(scheme, title, style_ids)`` tuples, reading the
+		snapshot if it is still valid and enumerating GtkSource otherwise.
+		'''
+		if self._languages is None:
+			snapshot = self._read_snapshot()
+			search_path = self._search_path(snapshot)
+			if search_path is not None and snapshot['key'] == self.fingerprint(search_path):
+				languages = [(scheme, title, tuple(style_ids)) for scheme, title, style_ids in snapshot['languages']]
+			else:
+				search_path, languages = self._enumerate()
+				self._write_snapshot(search_path, languages)
+			self._languages = languages
+		return self._languages
+
+	def style_ids(self, scheme):
+		'''
+		Returns the style ids of language *scheme*.
+		'''
+		for lang, _, style_ids in self.languages():
+			if lang == scheme:
+				return style_ids
+		raise KeyError("{} is not defined for gtksourceview".format(repr(scheme)))
+
+	def fingerprint(self, search_path):
+		'''
+		Returns a digest of *search_path* and the mtime of every .lang file
+		found in it.
+		'''
+		entries = []
+		for directory in search_path:
+			for filename in sorted(glob.glob(os.path.join(directory, '*.lang'))):
+				try:
+					entries.append((filename, os.stat(filename).st_mtime))
+				except OSError:
+					continue
+		digest = hashlib.sha1(json.dumps((search_path, entries)).encode('utf-8'))
+		return digest.hexdigest()
+
+	def _search_path(self, snapshot):
+		'''
+		Returns the search path to check *snapshot* against: the explicit
+		*search_path*, or the XDG directories followed by the ones GtkSource
+		added to them when the snapshot was taken. ``None`` if there is no
+		snapshot, or only one of the snapshot and the catalog has an explicit
+		search path.
+		'''
+		if snapshot is None or snapshot['explicit'] != (self.search_path is not None):
+			return None
+		if self.search_path is not None:
+			return self.search_path
+		search_path = xdg_search_path()
+		return search_path + [path for path in snapshot['builtin'] if path not in search_path]
+
+	def invalidate(self):
+		'''
+		Forget the loaded catalog so the next read checks the snapshot again.
+		'''
+		self._languages = None
+
+	def _read_snapshot(self):
+		if self.path is None or not os.path.exists(self.path):
+			return None
+		try:
+			with open(self.path, 'rb') as fp:
+				snapshot = json.loads(fp.read().decode('utf-8'))
+		except (IOError, ValueError):
+			return None
+		if snapshot.get('version') != snapshot_version:
+			return None
+		return snapshot
+
+	def _write_snapshot(self, search_path, languages):
+		if self.path is None:
+			return
+		directory = os.path.dirname(self.path)
+		if directory and not os.path.exists(directory):
+			os.makedirs(directory)
+		xdg = xdg_search_path()
+		snapshot = {
+			'version': snapshot_version,
+			'explicit': self.search_path is not None,
+			'builtin': [path for path in search_path if path not in xdg],
+			'languages': languages,
+		}
+		snapshot['key'] = self.fingerprint(self._search_path(snapshot))
+		temp_path = self.path + '.tmp'
+		with open(temp_path, 'wb') as fp:
+			fp.write(json.dumps(snapshot, separators=(',', ':')).encode('utf-8'))
+		os.rename(temp_path, self.path)
+
+	def _enumerate(self):
+		'''
+		Ask the GtkSource LanguageManager for every language and its style ids.
+
+		Returns (``tuple``) of the search path GtkSource used and the list of
+		languages.
+		'''
+		try:
+			from gi.repository import GtkSource
+		except ImportError as e:
+			raise CatalogUnavailableError("no valid language snapshot at {} and GtkSource "
+			                              "can't be imported to build one: {}".format(self.path, e))
+		manager = GtkSource.LanguageManager()
+		if self.search_path is not None:
+			manager.set_search_path(self.search_path)
+		languages = []
+		for lang in manager.get_language_ids():
+			language = manager.get_language(lang)
+			style_ids = language.get_style_ids()
+			name = language.get_name()
+			if name == "" or style_ids == []:
+				print("**GThemer Warning: could not add language: {} with style_ids: {}".format(repr(name), repr(style_ids)))
+				continue
+			languages.append((lang, name, tuple(style_ids)))
+		return list(manager.get_search_path()), languages
+
+
+_default_catalog = None
+
+def default_catalog():
+	'''
+	Returns the shared :class:`LanguageCatalog` backed by the default snapshot.
+	'''
+	global _default_catalog
+	if _default_catalog is None:
+		_default_catalog = LanguageCatalog()
+	return _default_catalog
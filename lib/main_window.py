@@ -27,45 +27,80 @@ __application__ = "GThemer" + __version__
 
 import pprint
 import os
+import traceback
+from contextlib import contextmanager
 
-from gi.repository import Gtk, Gdk, Pango
-from lxml import etree
+from gi.repository import Gtk, GLib
 
 from lib.styles import GThemerRow
-from lib.style_generator import StyleGenerator, ParseError
-from lib.stylesdb import GThemerDB
+from lib.styles_model import StylesModel
+from lib.stylesdb import GThemerDB, DEFAULT_DB_PATH
+from lib.timing import PhaseTimer, instruments
+from lib.write_behind import WriteBehindQueue
 
 __about_dialog__ = "ui/about_dialog.glade"
 __about_file__ = "docs/about.txt"
-__db_path__ = os.path.expanduser('~/.gthemer/default.db')
+__db_path__ = DEFAULT_DB_PATH
+__resource_file__ = "ui/gthemer.gresource"
+__resource_prefix__ = "/org/gthemer/ui/"
+
+_resources_registered = None
+
+def load_ui(builder, ui_file):
+	'''
+	Add the ui definition *ui_file* to *builder*. It is read from the
+	precompiled resource bundle if one has been built (see
+	compile_resources.sh), and from disk otherwise.
+	'''
+	global _resources_registered
+	if _resources_registered is None:
+		_resources_registered = os.path.exists(__resource_file__)
+		if _resources_registered:
+			from gi.repository import Gio
+			Gio.Resource.load(__resource_file__)._register()
+	if _resources_registered:
+		builder.add_from_resource(__resource_prefix__ + os.path.basename(ui_file))
+	else:
+		builder.add_from_file(ui_file)
 
 class MainWindow():
 	'''
 	The main window of GThemer
 	'''	
-	def __init__(self, ui_file):	
+	# styles_actions - The ui objects that need the styles loaded: New, Open,
+	# Save, Save As, Add Lang and Add Style.
+	styles_actions = ('imagemenuitem1', 'imagemenuitem2', 'imagemenuitem3',
+	                  'imagemenuitem4', 'button1', 'button2')
+
+	def __init__(self, ui_file, timer=None):	
+		'''
+		*ui_file* (``str``) is the main window ui definition.
+		
+		*timer* (``PhaseTimer``) records the startup phases, optional.
+		'''
+		self.timer = timer if timer is not None else PhaseTimer()
 		builder = self.builder = Gtk.Builder()
-		builder.add_from_file(ui_file)
-		builder.add_from_file(__about_dialog__)
+		load_ui(builder, ui_file)
 		builder.connect_signals(self)
 		self.filename = None
+		self.write_queue = None
+		# generator - The StyleGenerator of the last save, patched with the
+		# changes made since then on the next one.
+		self.generator = None
+		# saved_info - The info the last save was made with.
+		self.saved_info = None
+		self.timer.mark("load main window ui")
 
 	def initialize_app(self):
 		'''
-		Load the gui elements from the builder
+		Load the gui elements from the builder and show the window. The
+		database and the styles tree are loaded once the window has been drawn.
 		'''
 		
 		self.window = self.builder.get_object("main_window")
 		self.window.set_title(__application__)
-		self.window.show_all()
-		
-		if not os.path.exists(os.path.expanduser('~/.gthemer/')):
-			os.makedirs(os.path.expanduser('~/.gthemer/'))
-		self.sourceview_styles = GThemerDB(__db_path__)
-		# Generate language_combo
 		self.language_combo = self.builder.get_object("language_combo")
 		self.language_combo.set_model(None)
-		self.build_language_combo()
 		self.styles_combo = self.builder.get_object("styles_combo")
 		scrolled_window = self.builder.get_object("scrolledwindow")
 		self.name_entry = self.builder.get_object("name_entry")
@@ -76,22 +111,61 @@ class MainWindow():
 		# Create TreeView
 		self.styles_treeview = StylesTreeView()
 		self.styles_treeview._setup_columns()
-		self.styles_treeview.show_all()
 		scrolled_window.add(self.styles_treeview)
+		# Until load_styles has run there is no database nor styles tree.
+		self.set_styles_actions_sensitive(False)
+		self._first_draw_handler = self.window.connect('draw', self.on_first_draw)
+		self.window.show_all()
+		self.timer.mark("show main window")
+
+	def on_first_draw(self, widget, context):
+		'''
+		Once the window has been painted, schedule loading the styles.
+		'''
+		self.window.disconnect(self._first_draw_handler)
+		self.timer.mark("first paint")
+		GLib.idle_add(self.load_styles)
+		return False
+
+	def load_styles(self):
+		'''
+		Open the styles database and fill the language combo and the styles
+		tree.
+		'''
+		if not os.path.exists(os.path.expanduser('~/.gthemer/')):
+			os.makedirs(os.path.expanduser('~/.gthemer/'))
+		self.sourceview_styles = GThemerDB(__db_path__)
+		self.write_queue = WriteBehindQueue(self.sourceview_styles)
+		self.timer.mark("open database")
+		# Generate language_combo
+		self.build_language_combo()
 		# Initialize treemodel
-		styles_model = Gtk.TreeStore(str, str, str, str, str, bool, bool, bool, bool, bool)
+		styles_model = StylesModel()
 		self.styles_treeview.set_model(styles_model)
-		self.styles_interface = StylesTreeStoreInterface(styles_model, self.sourceview_styles)
-		self.styles_treeview.styles = self.styles_interface.styles_rows
+		self.styles_interface = StylesTreeStoreInterface(styles_model, self.sourceview_styles, self.write_queue)
+		self.styles_treeview.interface = self.styles_interface
 		# Setup globals
 		self.styles_interface.init_globals()
+		self.set_styles_actions_sensitive(True)
+		self.timer.mark("build styles tree")
+		self.timer.report()
+		return False
+
+	def set_styles_actions_sensitive(self, sensitive):
+		'''
+		Enable or disable the :attr:`styles_actions`.
+		'''
+		for name in self.styles_actions:
+			self.builder.get_object(name).set_sensitive(sensitive)
 		
 	def open_about_dialog(self, widget):
 		'''
 		Open the About Dialog.
 		'''
-		dialog = self.builder.get_object("aboutdialog")
-		text_view = self.builder.get_object("about_textview")
+		builder = Gtk.Builder()
+		load_ui(builder, __about_dialog__)
+		dialog = builder.get_object("aboutdialog")
+		text_view = builder.get_object("about_textview")
 		text_buffer = Gtk.TextBuffer()
 		text_buffer.set_text(open(__about_file__, 'rb').read())
 		text_view.set_buffer(text_buffer)
@@ -159,8 +233,8 @@ class MainWindow():
 		else:
 			self.styles_combo.remove_all()
 			styles = self.sourceview_styles.iter_styles(language=current_language)
-			for style in sorted(styles):
-				self.styles_combo.append_text(str(style['style']))
+			for style in sorted(record['style'] for record in styles):
+				self.styles_combo.append_text(str(style))
 
 	def add_group(self, widget):
 		'''
@@ -173,7 +247,7 @@ class MainWindow():
 		lang_name = model[current_iter][1]
 		self.styles_interface.add_group(lang_name,
 										lang_title,
-										sorted(name['style'] for name in self.sourceview_styles.iter_styles(lang_name)))
+										lambda: [record['style'] for record in self.sourceview_styles.iter_styles(lang_name)])
 
 	def add_style(self, widget):
 		'''
@@ -185,15 +259,37 @@ class MainWindow():
 		style = self.styles_combo.get_active_text()
 		self.styles_interface.add_style(lang, style)
 
+	def flush_edits(self):
+		'''
+		Write the edits still waiting in the write queue to the database. A
+		failure, e.g. a locked database, is printed rather than raised.
+		
+		Returns (``bool``) whether every edit was written.
+		'''
+		if self.write_queue is None:
+			return True
+		try:
+			self.write_queue.flush()
+		except Exception as e:
+			print("Error! {} edits could not be saved: {}".format(len(self.write_queue), e))
+			return False
+		return True
+
 	def on_delete_event(self, widget, event):
-		Gtk.main_quit()
+		try:
+			self.flush_edits()
+		finally:
+			Gtk.main_quit()
 
 	def on_quit(self, widget):
 		'''
 		Exit the application when Quit button is pressed
 		'''
-		self.window.destroy()
-		Gtk.main_quit()
+		try:
+			self.flush_edits()
+		finally:
+			self.window.destroy()
+			Gtk.main_quit()
 
 	def load_file(self, widget, data=None):
 		'''
@@ -213,96 +309,66 @@ class MainWindow():
 		response = dialog.run()
 		if response == Gtk.ResponseType.ACCEPT:
 			filename = dialog.get_filename()
-			print("Opening file: {}".format(filename))
 			dialog.destroy()
-			generator = StyleGenerator()
-			try:
-				info, styles = generator.parse_file(filename, self.sourceview_styles)
-			except ParseError:
-				traceback.print_exc()
-				# Open a dialog that says it failed to parse.
-				return
-			except Exception as e:
-				traceback.print_exc()
-				# Open a dialog that says it failed to parse.
-				return
-			# Set the info pane
-			#self.filename_entry.set_text(filename)
-			self.window.set_title(__application__ + " - " + filename)
-			self.name_entry.set_text(info['name'])
-			self.id_entry.set_text(info['id'])
-			self.author_entry.set_text(info['author'])
-			self.version_entry.set_text(info['version'])
-			self.description_entry.set_text(info['description'])
-			self.styles_interface.treestore.clear()
-			self.styles_interface.styles_rows = {}
-			# Set styles
-			for lang, config in sorted(styles.iteritems()):
-				if lang == '__globals':
-					# Add globals to the StylesTreeView
-					for scheme, conf in config.iteritems():
-						row = self.format_row(conf, scheme)
-						config[scheme] = row
-					self.styles_interface.init_globals(globals_defaults=config)
-				else:
-					language = config['name']
-					styles = config['styles']
-					for scheme, style in styles.iteritems():
-						row = self.format_row(style, scheme)
-						self.styles_interface.add_style(language, scheme, row)
+			self.open_file(filename)
 		else:
 			dialog.destroy()
 
-	def format_row(self, config, scheme):
+	@instruments.timed('load_file')
+	def open_file(self, filename):
 		'''
-		Format values for use in the StylesTreeView.
-		
-		*config* (``dict``) of attributes to set.
+		Load the scheme file *filename* into the info pane and the treeview.
 		'''
-		color_cols = {
-			'background': 'background_display',
-			'foreground': 'foreground_display',
-		}
-		bool_cols = ('italic', 'bold', 'underline', 'strikethrough')
-		markup_cols = ('background', 'foreground') + bool_cols
-		new_config = {}
-		for col_name, col_value in config.iteritems():
-			if col_name in bool_cols:
-				new_config[col_name] = True if col_value.lower() == 'true' else False
-		
-			elif col_name in color_cols:
-				text = config[col_name]
-				display_text = '<span background="{text}">{text}</span>'.format(text=text) if text else ""
-				new_config[color_cols[col_name]] = display_text
-				new_config[col_name + "_data"] = text
-		new_keys = {}
-		for key, value in new_config.iteritems():
-			new_keys[key] = value
-		markup = "<span"
-		if new_keys['foreground_data'] not in (None, ""):
-			markup += ' foreground="{}" '.format(new_keys['foreground_data'])
-		if new_keys['background_data'] not in (None, ""):
-			markup += ' background="{}" '.format(new_keys['background_data'])
-		if new_keys['bold'] == True:
-			markup += ' weight="bold" '
-		if new_keys['italic'] == True:
-			markup += ' style="italic" '
-		if new_keys['underline'] == True:
-			markup += ' underline="single" '
-		if new_keys['strikethrough'] == True:
-			markup += ' strikethrough="true" '
-		markup += ">{}</span>".format(scheme)
-		new_keys['definition'] = markup	
-		return new_keys
+		from lib.style_generator import StyleGenerator, ParseError
+		generator = StyleGenerator()
+		titles = dict(self.sourceview_styles.iter_languages())
+		global_rows = {}
+		# pending - the parsed styles grouped by language, each group is
+		# only added to the tree when it is expanded.
+		pending = {}
+		self.styles_interface.clear()
+		self.styles_interface.init_globals()
+		self.generator = None
+		try:
+			for kind, style in generator.iterparse_file(filename):
+				if kind == 'info':
+					# Set the info pane
+					self.window.set_title(__application__ + " - " + filename)
+					self.name_entry.set_text(style['name'])
+					self.id_entry.set_text(style['id'])
+					self.author_entry.set_text(style['author'])
+					self.version_entry.set_text(style['version'])
+					self.description_entry.set_text(style['description'])
+					continue
+				scheme = style['name']
+				if ":" in scheme:
+					language = scheme.split(':')[0]
+					pending.setdefault(titles.get(language, language), []).append((scheme, style))
+				else:
+					global_rows[scheme] = style
+		except ParseError:
+			traceback.print_exc()
+			# Open a dialog that says it failed to parse.
+			return
+		except Exception as e:
+			traceback.print_exc()
+			# Open a dialog that says it failed to parse.
+			return
+		instruments.count('load_file.languages', len(pending))
+		with self.styles_interface.detached(self.styles_treeview):
+			for language, rows in sorted(pending.iteritems()):
+				self.styles_interface.add_lazy_group(language, rows)
+		# Add globals to the StylesTreeView
+		self.styles_interface.init_globals(globals_defaults=global_rows)
 
 	def on_new(self, widget):
 		'''
 		When the "New" button is pressed, clear the current contents of the
 		application.
 		'''
-		self.styles_interface.styles_rows = {}
-		self.styles_interface.treestore.clear()
+		self.styles_interface.clear()
 		self.filename = None
+		self.generator = None
 		self.styles_interface.init_globals()
 		self.window.set_title(__application__)
 		self.name_entry.set_text("")
@@ -331,22 +397,19 @@ class MainWindow():
 			self.filename = filename
 			self._save_file()
 
+	@instruments.timed('_save_file')
 	def _save_file(self):
 		'''
 		Save the theme to the current filepath in `self.filename`
 		'''
-		# Build the styles dict based on the styles that are laid out in the
-		# StylesTreeView.
-		styles_object = self.styles_interface.treestore
-		generator = StyleGenerator()
-		info = self. get_info()
-		generator.add_info(info['id'], info['name'], 
-						   author=info['author'],
-						   description=info['description'],
-						   version=info['version'])	
-		generator.add_styles(styles_object)
-		print etree.tostring(generator.tree.getroot(), pretty_print=True)
-		generator.save_file(info['filename'])
+		# The first save builds the tree from the styles that are laid out in
+		# the StylesTreeView, later ones only patch the styles changed since.
+		from lib.style_generator import save_styles
+
+		info = self.get_info()
+		self.generator = save_styles(self.styles_interface.treestore, info['filename'], info,
+		                             self.generator, self.saved_info)
+		self.saved_info = info
 
 	def get_info(self):
 		'''
@@ -371,71 +434,114 @@ class MainWindow():
 
 class StylesTreeStoreInterface():
 	'''
-	This class handles manipulating the TreeStore, adding and deleting styles
-	and languages to the TreeStore.
+	This class handles manipulating the StylesModel, adding and deleting styles
+	and languages to the StylesModel.
 	'''
+
+	# globals_title - The group the global styles are shown in.
+	globals_title = "Global gedit Settings"
 	
-	# style_rows - mapping of style schemes to the GtkIter they belong to.
-	styles_rows = {}
-	
-	def __init__(self, treestore, styles):
+	def __init__(self, treestore, styles, write_queue=None):
 		'''
-		*treestore* (``Gtk.TreeStore``) that will contain the data
+		*treestore* (``StylesModel``) that will contain the data
 		
 		*styles* (``GThemerDB``) is the GThemerDB reference.
+		
+		*write_queue* (``WriteBehindQueue``) is where edited rows are queued
+			to be saved to *styles*, ``None`` to not save them.
 		'''
 		self.treestore = treestore
 		self.styles = styles
+		self.write_queue = write_queue
+
+	def clear(self):
+		'''
+		Remove every language and style from the treestore.
+		'''
+		self.treestore.clear()
 
 	def init_globals(self, globals_defaults={}):
 		'''
 		Initialize the globals styles in the treestore
 		
-		*globals_defaults* (``dict``) is optional defaults to give the globals.
+		*globals_defaults* (``dict``) is optional defaults to give the globals,
+			mapping global style names to their attributes.
 		'''
 		self.global_styles = sorted([glob for glob in self.styles.iter_globals()], key=lambda x: x['scheme'])
-		if '__globals' in self.styles_rows:
-			child_iter = self.treestore.iter_children(self.styles_rows['__globals'])
-			# Clear global's children
-			remove = True
-			while remove != False:
-				remove = self.treestore.remove(child_iter)
-		else:
-			default_row = GThemerRow()
-			default_row['definition'] = "Global gedit Settings"
-			global_iter = self.treestore.append(None, default_row.get_row())
-			self.styles_rows['__globals'] = global_iter
-		
-		# Add new iters
-		for style in self.global_styles:
-			row = globals_defaults.get(style['scheme'], {})
-			global_row = GThemerRow(**row)
-			global_row['definition'] = style['scheme'] if row == {} else global_row['definition']
-			self.treestore.append(self.styles_rows['__globals'], global_row.get_row())
+		for style in self.treestore.style_ids(self.globals_title):
+			self.treestore.remove_style(self.globals_title, style)
+		self.treestore.add_styles(self.globals_title,
+		                          [(style['scheme'], globals_defaults.get(style['scheme'])) for style in self.global_styles])
 	
 	def add_group(self, lang_name, lang_title, styles):
 		'''
 		Adds an entire language group of definitions to the TreeStore. If one
 		of the languages already exist in the structure
+		
+		*styles* (``iterable``) of style names, or a ``callable`` returning
+			them that is only called once the group is expanded.
 		'''	
-		if lang_title not in self.styles_rows:
-			# A new language is being added to the TreeStore
-			# First get the reference to the new language's GtkIter and
-			# add it to self.styles.
-			
-			# language_row -- this row is only comprised of the language name
-			language_row = GThemerRow()
-			language_row['definition'] = lang_title
-			# New iter reference to the language
-			new_iter = self.treestore.append(None, language_row.get_row())
-			self.styles_rows[lang_title] = new_iter
-
-		# Append the data to the new row.
-		for defn in sorted(styles):
-			if not self.in_treestore(self.styles_rows[lang_title], defn):
-				default_row = GThemerRow()
-				default_row['definition'] = defn
-				self.treestore.append(self.styles_rows[lang_title], default_row.get_row())
+		if callable(styles):
+			self.add_lazy_group(lang_title, lambda: [(defn, None) for defn in sorted(styles())])
+		else:
+			self.add_lazy_group(lang_title, [(defn, None) for defn in sorted(styles)])
+
+	def add_lazy_group(self, lang, rows):
+		'''
+		Add a language group whose styles are only added to the treestore
+		when it is expanded, see :meth:`fill_group`. Until then the group has
+		a placeholder child so it can be expanded.
+		
+		*lang* (``str``) is the language to add the styles to.
+		
+		*rows* (``list``) of ``(style, config)`` tuples, see :meth:`add_styles`,
+			or a ``callable`` returning them.
+		'''
+		self.treestore.add_lazy_group(lang, rows)
+
+	def fill_group(self, lang):
+		'''
+		Add the styles of a group added with :meth:`add_lazy_group` to the
+		treestore, replacing its placeholder.
+		
+		Returns (``bool``) whether there was anything to add.
+		'''
+		return self.treestore.fill_group(lang)
+
+	def on_row_expanded(self, view, lang_iter, path):
+		'''
+		Fill in a language group the first time it is expanded.
+		'''
+		self.fill_group(self.treestore[lang_iter][GThemerRow.index_of('definition')])
+
+	def add_styles(self, lang, rows):
+		'''
+		Add a batch of style definitions to a language group, skipping the ones
+		already in the group. Best used while the treestore is
+		:meth:`detached` from its view.
+		
+		*lang* (``str``) is the language to add the styles to.
+		
+		*rows* (``iterable``) of ``(style, config)`` tuples, where *config*
+			(``dict``) is the attributes of the style as they are parsed from
+			a scheme, or ``None`` for the default row.
+		'''
+		self.treestore.add_styles(lang, rows)
+
+	@contextmanager
+	def detached(self, view):
+		'''
+		Context manager that detaches the treestore from *view* while rows are
+		added in bulk, so the view doesn't react to every inserted row, and
+		reattaches it once at the end.
+		'''
+		view.freeze_child_notify()
+		view.set_model(None)
+		try:
+			yield self.treestore
+		finally:
+			view.set_model(self.treestore)
+			view.thaw_child_notify()
 
 	def add_style(self, lang, style, row=None):
 		'''
@@ -446,65 +552,73 @@ class StylesTreeStoreInterface():
 		
 		*style* (``str``) is the name of the style to add.
 		
-		*row* (``dict``) is optional attributes to set on the row. ``None`` by
+		*row* (``dict``) is optional attributes to set on the style. ``None`` by
 			default to represent the default row
 		'''
-		lang_iter = None
-		if lang not in self.styles_rows:
-			language_row = GThemerRow()
-			language_row['definition'] = lang
-			#New iter reference to the language
-			new_iter = self.treestore.append(None, language_row.get_row())
-			self.styles_rows[lang] = new_iter
-			lang_iter = new_iter
-		else:
-			lang_iter = self.styles_rows[lang]
+		self.fill_group(lang)
+		self.treestore.add_styles(lang, [(style, row)])
 
-		if not self.in_treestore(lang_iter, style):
-			row = {} if row is None else row
-			default_row = GThemerRow(**row)
-			default_row['definition'] = style if row == {} else default_row['definition']
-			self.treestore.append(self.styles_rows[lang], default_row.get_row())
+	def store_row(self, style_iter):
+		'''
+		Queue the attributes of the style row at *style_iter* to be saved to
+		the database.
+		'''
+		if self.write_queue is None:
+			return
+		lang, style, config = self.treestore.get_style(style_iter)
+		if lang == self.globals_title:
+			self.write_queue.put_global(style, config)
+		else:
+			self.write_queue.put_format(style.split(':')[0], style, config)
 
-	def in_treestore(self, lang_iter, definition):
+	def in_treestore(self, lang, definition):
 		'''
 		Returns True if definition is defined in treestore, False if it isn't
 		'''
-		child_iter = self.treestore.iter_children(lang_iter)
-		while child_iter != None:
-			_, __, treestore_text, ___ = Pango.parse_markup(self.treestore[child_iter][0], len(self.treestore[child_iter][0]), "\0")
-			if treestore_text == definition:
-				return True
-			child_iter = self.treestore.iter_next(child_iter)
-		return False
+		return self.treestore.has_style(lang, definition)
+
+	def get_style_iter(self, lang, definition):
+		'''
+		Returns the GtkIter of style *definition* of language *lang*, ``None``
+		if it isn't in the treestore.
+		'''
+		self.fill_group(lang)
+		return self.treestore.style_iter(lang, definition)
+
+	def remove_style(self, lang, definition):
+		'''
+		Remove style *definition* from language *lang*.
+		'''
+		self.fill_group(lang)
+		self.treestore.remove_style(lang, definition)
+
+	def remove_language(self, lang):
+		'''
+		Remove language *lang* and all of its styles.
+		'''
+		self.treestore.remove_group(lang)
 
 	def get_styles(self):
 		'''
 		Generate a *styles dict* based on the information that's in the
-		treestore.
+		treestore, including the groups that were never expanded.
 		
 		styles = {
 			'Python':{
 				'python:keyword': {
-					'foreground': '',
-					'background': '',
-					'bold': False,
-					'italic': False,
-					'underline': False,
-					'strikethrough': False,
+					'foreground': None,
+					'background': None,
+					'bold': True,
+					'italic': None,
+					'underline': None,
+					'strikethrough': None,
 				}
 			}
 		}
 		'''
 		styles = {}
-		for language, style_iter in self.styles.iteritems():
-			used_styles = {}
-			child_iter = self.treestore.iter_children(style_iter)
-			while child_iter is not None:
-				style_name, lang_style = self.generate_lang_style(self.treestore[child_iter][:])
-				used_styles[style_name] = lang_style
-				child_iter = self.treestore.iter_next(child_iter)
-			styles[language] = used_styles
+		for lang, style, config in self.treestore.iter_styles():
+			styles.setdefault(lang, {})[style] = config
 		return styles
 
 				
@@ -521,6 +635,8 @@ class StylesTreeView(Gtk.TreeView):
 
 	def __init__(self):
 		Gtk.TreeView.__init__(self)
+		# interface - The StylesTreeStoreInterface that owns the model.
+		self.interface = None
 		self.set_hover_selection(True)
 		self.set_grid_lines(True)
 	
@@ -558,9 +674,13 @@ class StylesTreeView(Gtk.TreeView):
 				
 			self.append_column(column)
 		self.connect('button-press-event', self.on_button_press_event)
+		self.connect('row-expanded', self.on_row_expanded)
+
+	def on_row_expanded(self, treeview, lang_iter, path):
+		if self.interface is not None:
+			self.interface.on_row_expanded(treeview, lang_iter, path)
 	
 	def on_cell_changed(self, widget, path, text, column):
-		print "path: {}, text: {}".format(path, text)
 		treestore = self.get_model()
 		treestore.set_value(treestore.get_iter(path), column, text)
 
@@ -576,7 +696,7 @@ class StylesTreeView(Gtk.TreeView):
 			if return_val is not None:
 				path, col, x, y = return_val
 				model = treeview.get_model()
-				if model.iter_parent(model.get_iter(path)) is not None:
+				if model.iter_parent(model.get_iter(path)) is not None and model[path][self.row_skeleton.index_of('style_id')]:
 					self.handle_click(path, col)
 		elif event.button == 3: # Right click -- menus
 			return_val = treeview.get_path_at_pos(int(event.x), int(event.y))
@@ -593,7 +713,7 @@ class StylesTreeView(Gtk.TreeView):
 						globl = False
 					self.popup = self.create_lang_popup_menu(model, path, is_global=globl)
 					self.popup.popup(None, None, None, None, event.button, event.time)
-				else:
+				elif model[path][self.row_skeleton.index_of('style_id')]:
 					self.popup = None
 					# A style was clicked on, open style menu
 					if model[model.iter_parent(model.get_iter(path))][0] == "Global gedit Settings":
@@ -607,8 +727,7 @@ class StylesTreeView(Gtk.TreeView):
 		'''
 		Create a popup menu for Styles controls.
 		'''
-		style = model[path][0]
-		_, __, style_text, ___ = Pango.parse_markup(style, len(style), "\0")
+		style_text = model[path][self.row_skeleton.index_of('style_id')]
 		menu = self.popup = Gtk.Menu()
 		if not is_global:
 			menuitem1 = Gtk.MenuItem("Delete {}".format(repr(style_text)))
@@ -640,18 +759,17 @@ class StylesTreeView(Gtk.TreeView):
 		'''
 		Delete style at ``path``
 		'''
-		del model[path]
+		style_text = model[path][self.row_skeleton.index_of('style_id')]
+		language = model[model.iter_parent(model.get_iter(path))][0]
+		self.interface.remove_style(language, style_text)
 
 	def clear_style(self, widget, model, path):
 		'''
 		Clear style at ``path``
 		'''
-		style = model[path][0]
-		_, __, style_text, ___ = Pango.parse_markup(style, len(style), "\0")
-		default_row = GThemerRow()
-		default_row['definition'] = style_text
-		for i in xrange(len(default_row)):
-			model[path][i] = default_row.get_row()[i]
+		model.reset_style(model[path].iter)
+		if self.interface is not None:
+			self.interface.store_row(model[path].iter)
 
 	def delete_language(self, widget, model, path):
 		'''
@@ -659,13 +777,14 @@ class StylesTreeView(Gtk.TreeView):
 		language.
 		'''
 		language = model[path][0]
-		del model[path]
-		del self.styles[language]
+		self.interface.remove_language(language)
 
 	def clear_styles(self, widget, model, path):
 		'''
 		Clear all styles associated with ``language``.
 		'''
+		if self.interface is not None:
+			self.interface.fill_group(model[path][0])
 		path = model.get_iter(path)
 		child_iter = model.iter_children(path)
 		while child_iter is not None:
@@ -677,6 +796,8 @@ class StylesTreeView(Gtk.TreeView):
 		When a column is left clicked, it will perform an action based on the
 		column name. This function handles calling the particular action.
 		'''
+		from gi.repository import Gdk
+
 		model = self.get_model()
 		change_made = False
 		if col.get_title() in self.color_cols:
@@ -692,7 +813,6 @@ class StylesTreeView(Gtk.TreeView):
 				# cell in the TreeModel
 				color_string = rgba_to_hex(select_color)
 				model[path][self.row_skeleton.index_of(col.get_title().lower() + '_data')] = color_string
-				model[path][self.row_skeleton.index_of(col.get_title().lower() + '_display')] = '<span background="{col}" foreground="{readable}">{col}</span>'.format(col=color_string, readable=get_readable_color(select_color))
 				change_made = True
 				
 			elif response == Gtk.ResponseType.CANCEL:
@@ -707,37 +827,12 @@ class StylesTreeView(Gtk.TreeView):
 			model[path][self.row_skeleton.index_of(col.get_title().lower())] = not current_value
 			change_made = True
 		
-		# A change is made to the row, so 
+		# A change is made to the row, the model redraws it from the new
+		# settings, so only save them.
 		if change_made == True:
-			# Save row settings to the tree model
-			row = GThemerRow(*[i for i in model[path]])
-			self.apply_row_settings(row, path, model)
-
-	def apply_row_settings(self, row, path, model):
-		'''
-		Applies all of the settings that have been applied to the given row_iter
-		onto the first column.
-		'''
-		row_text = row['definition']
-		_, __, plain_text, ___ = Pango.parse_markup(row_text, len(row_text), "\0")
-		markup = "<span"
-		if row['foreground_data'] not in (None, ""):
-			markup += ' foreground="{}" '.format(row['foreground_data'])
-		if row['background_data'] not in (None, ""):
-			markup += ' background="{}" '.format(row['background_data'])
-		if row['bold'] == True:
-			markup += ' weight="bold" '
-		if row['italic'] == True:
-			markup += ' style="italic" '
-		if row['underline'] == True:
-			markup += ' underline="single" '
-		if row['strikethrough'] == True:
-			markup += ' strikethrough="true" '
-		
-		markup += ">{}</span>".format(plain_text)
-		row['definition'] = markup
-		model[path] = row.get_row()
-		
+			if self.interface is not None:
+				self.interface.store_row(model[path].iter)
+
 
 def get_readable_color(color):
 	'''
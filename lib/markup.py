@@ -0,0 +1,144 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Pango markup for the rows of the StylesTreeView.
+
+Many styles share the same colors and flags, so the markup is memoized in a
+bounded LRU cache. Its ``markup_cache.hits`` and ``markup_cache.misses`` are
+counted by :mod:`lib.timing`.
+"""
+
+from collections import OrderedDict
+
+from lib.styles import FLAG_BITS
+from lib.timing import instruments
+
+# flag_bits - The bit of each text flag, see FLAG_BITS.
+flag_bits = dict(FLAG_BITS)
+
+# flag_attributes - The span attribute set for each text flag.
+flag_attributes = {
+	'bold': 'weight="bold"',
+	'italic': 'style="italic"',
+	'underline': 'underline="single"',
+	'strikethrough': 'strikethrough="true"',
+}
+
+class MarkupCache:
+	'''
+	Builds span markup, remembering the *size* most recently used results.
+	'''
+
+	def __init__(self, size=4096):
+		self.size = size
+		self.cache = OrderedDict()
+
+	def _lookup(self, key, build, *args):
+		try:
+			value = self.cache.pop(key)
+		except KeyError:
+			instruments.count('markup_cache.misses')
+			value = build(*args)
+			if len(self.cache) >= self.size:
+				self.cache.popitem(last=False)
+		else:
+			instruments.count('markup_cache.hits')
+		self.cache[key] = value
+		return value
+
+	def style_markup(self, style_id, foreground, background, flags):
+		'''
+		Returns the markup showing *style_id* in its own style.
+
+		*style_id* (``str``) is the text of the markup.
+
+		*foreground* (``str``) and *background* (``str``) colors, ``None`` or
+			empty when unset.
+
+		*flags* (``int``) are the packed text flags, see
+			:func:`lib.styles.pack_flags`.
+		'''
+		return self._lookup(('style', style_id, foreground, background, flags),
+		                    _build_style_markup, style_id, foreground, background, flags)
+
+	def color_markup(self, color, readable=None):
+		'''
+		Returns the markup displaying the color string *color* on itself, in
+		the *readable* text color if one is given.
+		'''
+		if not color:
+			return ""
+		return self._lookup(('color', color, readable), _build_color_markup, color, readable)
+
+	def clear(self):
+		self.cache.clear()
+
+
+def _build_style_markup(style_id, foreground, background, flags):
+	attributes = []
+	if foreground:
+		attributes.append('foreground="{}"'.format(foreground))
+	if background:
+		attributes.append('background="{}"'.format(background))
+	for key, bit in FLAG_BITS:
+		if flags & bit:
+			attributes.append(flag_attributes[key])
+	return "<span {}>{}</span>".format(" ".join(attributes), style_id)
+
+def _build_color_markup(color, readable):
+	if readable is None:
+		return '<span background="{col}">{col}</span>'.format(col=color)
+	return '<span background="{col}" foreground="{readable}">{col}</span>'.format(col=color, readable=readable)
+
+
+# markup_cache - The cache shared by every view.
+markup_cache = MarkupCache()
+
+def style_markup(style_id, foreground, background, flags):
+	return markup_cache.style_markup(style_id, foreground, background, flags)
+
+def color_markup(color, readable=None):
+	return markup_cache.color_markup(color, readable)
+
+def style_cell(key, style_id, table, slot):
+	'''
+	Returns the value of the *key* column of the row showing *style_id*, or
+	``None`` if *key* is not a column of style rows. Only the attributes the
+	column shows are read.
+
+	*key* (``str``) is one of the :attr:`GThemerRow.row_keys`.
+
+	*style_id* (``str``) is the style shown in the row.
+
+	*table* (``StyleTable``) holds the attributes of the style.
+
+	*slot* (``int``) is the slot of the style in *table*.
+	'''
+	if key == 'style_id':
+		return style_id
+	if key == 'definition':
+		if not table.is_set(slot):
+			return style_id
+		return style_markup(style_id, table.get_color(slot, 'foreground'),
+		                    table.get_color(slot, 'background'), table.get_flags(slot))
+	if key in ('foreground_display', 'background_display'):
+		return color_markup(table.get_color(slot, key[:-len('_display')]))
+	if key in ('foreground_data', 'background_data'):
+		return table.get_color(slot, key[:-len('_data')]) or ''
+	bit = flag_bits.get(key)
+	if bit is not None:
+		return bool(table.get_flags(slot) & bit)
+	return None
@@ -21,30 +21,24 @@ all of the languages and their associated styles.
 __author__ = "Wesley Hansen"
 __date__ = "08/28/2012 11:16:31 PM"
 
-from gi.repository import GtkSource
+from lib.language_catalog import default_catalog
 
 class SourceviewStyles():
-	def __init__(self):
+	def __init__(self, catalog=None):
 		'''
 		styles = {
 			{name}: (style_id1, style_id2),
 		}
 		'''
 		self.styles = {}
-		self.manager = GtkSource.LanguageManager() # Get the language manager
+		self.catalog = catalog if catalog is not None else default_catalog()
 
 	def build_styles(self):
 		'''
 		Builds the styles dictionary.
 		'''
 		self.styles = {}
-		languages = self.manager.get_language_ids()
-		for lang in languages:
-			style_ids = self.manager.get_language(lang).get_style_ids()
-			name = self.manager.get_language(lang).get_name()
-			if name == "" or style_ids == []:
-				print "Oops, there was something wrong, not adding this language, name: {}, style_ids: {}".format(repr(name), repr(style_ids))
-				continue
+		for lang, name, style_ids in self.catalog:
 			self.styles[name] = tuple(style_ids)
 		
 	def get_styles(self):
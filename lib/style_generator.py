@@ -52,10 +52,12 @@ __status__ = "Prototype"
 import os
 import pprint
 
+from itertools import chain
+from collections import OrderedDict
+
 from lxml import etree
-from gi.repository import Pango, Gtk
 
-from lib.styles import GThemerRow
+from lib.timing import instruments
 
 class ParseError(Exception):
 	'''
@@ -65,105 +67,118 @@ class ParseError(Exception):
 
 class StyleGenerator():
 	'''
-	Converts a treestore to the a style-schemes xml.
+	Builds a style-schemes xml from styles added one at a time.
 	'''
 
-	style_columns = {
-		'definition': 'name',
-		'foreground_data': 'foreground',
-		'background_data': 'background',
-		'bold': 'bold',
-		'italic': 'italic',
-		'underline': 'underline',
-		'strikethrough': 'strikethrough'
-	}
-	
 	def __init__(self):
 		root = etree.Element("style-scheme")
 		self.tree=etree.ElementTree( root )
+		# elements - mapping of style names to their <style> element, see
+		# update_style.
+		self.elements = {}
+		# groups - mapping of the groups given to add_style to the names of
+		# their styles, see remove_group.
+		self.groups = {}
+
+	# indent - Written before each child of <style-scheme> in a saved file.
+	indent = "\n  "
 
-	def parse_file(self, filename, db):
+	# scheme_columns - Attributes read from each <style> element of a scheme.
+	scheme_columns = ('name', 'foreground', 'background', 'italic', 'bold', 'underline', 'strikethrough')
+
+	def iterparse_file(self, filename):
 		'''
-		Opens an existing xml scheme file.
+		Stream an existing xml scheme file in a single pass, releasing each
+		element once it has been read so memory stays bounded.
 		
 		*filename* (``str``) xml styles-scheme filepath.
-		*db* (``GThemerDB``) is a reference to the database that
-			contains all the styles nad 
-		'''
-		styles = {}
-		tree = etree.parse(open(filename, 'rb'))
-		# Retrieve file info.
-		root = tree.xpath('//style-scheme')
-		if root is None:
-			raise ParseError("'style-scheme' tag not found.")
-		root = root[0]
-		_id = root.get('id')
-		name = root.get('_name')
-		version = root.get('version')
-		author_node = tree.xpath('//author')
-		author = None
-		if author_node is not None:
-			author = author_node[0].text
-		descrip_node = tree.xpath('//_description')
-		descrip = None
-		if descrip_node is not None:
-			descrip = descrip_node[0].text
 		
+		Yields ``('info', info)`` once, as soon as the header has been read,
+		followed by ``('style', attributes)`` for every <style> element in
+		file order. *attributes* (``dict``) maps :attr:`scheme_columns` to
+		their values, ``None`` for missing attributes.
+		'''
 		info = {
-			'id': _id or '',
-			'name': name or '',
-			'version': version or '',
-			'author': author or '',
-			'description': descrip or '',
+			'id': '',
+			'name': '',
+			'version': '',
+			'author': '',
+			'description': '',
 		}
-		
-		# Determine available styles from db
-		print("Retrieving database information...")
-		global_styles = [glob['scheme'] for glob in db.iter_globals()]
-		style_languages = {style[0]: style[1] for style in db.iter_languages()}
-		for scheme, title in style_languages.iteritems():
-			styles.update(
-				{
-					scheme:{
-						'name': title,
-						'styles': {}
-					}
-				}
-			)
-		styles['__globals'] = {}
-		# Parse the file
-		print("Beginning iterparse of 'style' tags...")
-		columns = ('name', 'foreground', 'background', 'italic', 'bold', 'underline', 'strikethrough')
-
-		for event, element in etree.iterparse(open(filename, 'rb'), tag='style'):
-			if event == 'end':
-				scheme_name = element.get('name')
-				update_row = {col_name: element.get(col_name) for col_name in columns}
-				if ":" in element.get('name'):
-					# This element is assigned to a language
-					scheme = scheme_name.split(':')[0]
-					style_scheme = styles.get(scheme, {'name': style_languages.get(scheme, scheme),'styles':{}})
-					style_scheme['styles'].update({scheme_name: update_row})
-					styles.update({scheme: style_scheme})
-				else:
-					# This is a global...update the global struct
-					styles['__globals'].update({scheme_name: update_row})
+		info_sent = False
+		found_root = False
+		with open(filename, 'rb') as fp:
+			try:
+				for event, element in etree.iterparse(fp, events=('start', 'end')):
+					if event == 'start':
+						if element.tag == 'style-scheme':
+							found_root = True
+							info['id'] = element.get('id') or ''
+							info['name'] = element.get('_name') or element.get('name') or ''
+							info['version'] = element.get('version') or ''
+						elif element.tag == 'style' and not info_sent:
+							# Everything before the first style is header.
+							info_sent = True
+							yield 'info', info
+						continue
+					if element.tag == 'style':
+						yield 'style', {col_name: element.get(col_name) for col_name in self.scheme_columns}
+					elif element.tag == 'author':
+						info['author'] = element.text or ''
+					elif element.tag in ('_description', 'description'):
+						info['description'] = element.text or ''
+					elif element.tag == 'style-scheme':
+						continue
+					# Release the element and any siblings already processed.
+					element.clear()
+					while element.getprevious() is not None:
+						del element.getparent()[0]
+			except etree.XMLSyntaxError as e:
+				raise ParseError("{}: {}".format(filename, e))
+		if not found_root:
+			raise ParseError("'style-scheme' tag not found.")
+		if not info_sent:
+			yield 'info', info
 
-		new_styles = {}
-		for style, config in styles.iteritems():
-			if style == "__globals":
-				new_styles[style] = config
+	@instruments.timed('parse_file')
+	def parse_file(self, filename, db=None):
+		'''
+		Opens an existing xml scheme file.
+		
+		*filename* (``str``) xml styles-scheme filepath.
+		*db* (``GThemerDB``) is a reference to the database that
+			contains all the styles and their language titles, optional.
+		
+		Returns (``tuple``) the ``(info, styles)`` of the scheme, where
+		*styles* maps each language scheme to its ``name`` and ``styles``
+		and ``'__globals'`` to the global styles.
+		'''
+		style_languages = dict(db.iter_languages()) if db is not None else {}
+		info = None
+		styles = {'__globals': {}}
+		for kind, update_row in self.iterparse_file(filename):
+			if kind == 'info':
+				info = update_row
+				continue
+			scheme_name = update_row['name']
+			if ":" in scheme_name:
+				# This element is assigned to a language
+				scheme = scheme_name.split(':')[0]
+				if scheme not in styles:
+					styles[scheme] = {'name': style_languages.get(scheme, scheme), 'styles': {}}
+				styles[scheme]['styles'][scheme_name] = update_row
 			else:
-				if config['styles'] != {}:
-					new_styles[style] = config
-		styles = new_styles
-				
-				
-		return info, styles					
+				# This is a global...update the global struct
+				styles['__globals'][scheme_name] = update_row
+		if instruments.enabled:
+			instruments.count('parse_file.styles', sum(len(config['styles']) for config in styles.itervalues() if 'styles' in config))
+			instruments.count('parse_file.globals', len(styles['__globals']))
+		return info, styles
 		
 	def add_info(self, scheme_id, name, author=None, description=None, version=None):
 		'''
-		Add info about the style...like name, description, author
+		Add info about the style...like name, description, author. Calling it
+		again replaces the info.
 		'''
 		root = self.tree.getroot()
 		root.set('id', scheme_id)
@@ -171,99 +186,160 @@ class StyleGenerator():
 		if version is None:
 			raise ValueError('Version is required!')
 		root.set('version', version)
-		if author is not None:
-			author_node = etree.SubElement(root, 'author')
-			author_node.text = author
-		if description is not None:
-			description_node = etree.SubElement(root, '_description')
-			description_node.text = description
+		for tag, text in (('author', author), ('_description', description)):
+			node = root.find(tag)
+			if text is None:
+				if node is not None:
+					root.remove(node)
+				continue
+			if node is None:
+				node = etree.Element(tag)
+				# The header goes before the styles.
+				root.insert(0 if tag == 'author' else len(root.findall('author')), node)
+			node.text = text
 		
-	def add_styles(self, styles):
+	def add_style(self, name, config, group=None):
 		'''
-		Add styles nodes to the tree
+		Add a single style node to the tree.
+		
+		*name* (``str``) is the style name, e.g. ``python:keyword`` or a
+			global style like ``text``.
+		
+		*config* (``dict``) of style attributes, ``None`` values are left out.
+		
+		*group* (``str``) the style belongs to, e.g. its language title, so
+			the styles of a group can be removed together, optional.
 		'''
 		assert self.tree is not None, "lxml.etree hasn't been set"
+		element = self.elements[name] = etree.SubElement(self.tree.getroot(), 'style')
+		element.set('name', name)
+		self._set_attributes(element, config)
+		if group is not None:
+			self.groups.setdefault(group, set()).add(name)
 
-		root = self.tree.getroot()
-		defn_iter = styles.iter_children(None)
-		while defn_iter is not None:
-			lang = GThemerRow(*[style for style in styles[defn_iter]])
-			print "Lang: {}".format(lang.get_row())
-			if lang['definition'] == 'Global gedit Settings':
-				# Handle globals
-				child_iter = styles.iter_children(defn_iter)
-				while child_iter is not None:
-					child = GThemerRow(*[style for style in styles[child_iter]])
-					print("Global child: {}".format(child.get_row()))
-					if not all(item is None for item in child):
-						element = etree.Element('style')
-						for row, column in self.style_columns.iteritems():
-							attr = str(child[row]) if isinstance(child[row], bool) else child[row]
-							if column == 'name':
-								_, __, attr, ___ = Pango.parse_markup(child[row], len(child[row]), "\0")
-							if attr is not None:
-								element.set(column, attr)
-						root.append(element)
-					else:
-						print("Oops, this row is empty for lang: {}. {}".format(lang['definition'], child.get_row() ))
-					child_iter = styles.iter_next(child_iter)
-			else:
-				# Handle everything else.
-				child_iter = styles.iter_children(defn_iter)
-				while child_iter is not None:
-					child = GThemerRow(*styles[child_iter])
-					print("Child: {}".format(child.get_row()))
-					if not all(item is None for item in child):
-						element = etree.Element('style')
-						for row, column in self.style_columns.iteritems():
-							attr = str(child[row]) if isinstance(child[row], bool) else child[row]
-							if column == 'name':
-								_, __, attr, ___ = Pango.parse_markup(child[row], len(child[row]), "\0")
-							if attr is not None:
-								element.set(column, attr)
-						root.append(element)
-					else:
-						print("Oops, this row is empty for lang: {}. {}".format(lang['definition'], child.get_row() ))
-					child_iter = styles.iter_next(child_iter)
-			defn_iter = styles.iter_next(defn_iter)
+	def _set_attributes(self, element, config):
+		for column in self.scheme_columns[1:]:
+			value = config.get(column)
+			if value is not None:
+				element.set(column, str(value).lower() if isinstance(value, bool) else value)
+			elif column in element.attrib:
+				del element.attrib[column]
 
-	def save_file(self, filename):
+	def update_style(self, name, config, group=None):
 		'''
-		Save the etree to file.
+		Patch the style node added for *name* with :meth:`add_style` in
+		place, or add it to *group* if there is none.
+		
+		*config* (``dict``) of style attributes, ``None`` values are removed.
 		'''
-		assert self.tree is not None, "lxml.etree hasn't been set"
-		string = etree.tostring(self.tree, pretty_print=True)
-		with open(filename, 'w') as fp:
-			fp.write(string)
+		if name in self.elements:
+			self._set_attributes(self.elements[name], config)
+		else:
+			self.add_style(name, config, group)
+
+	def remove_style(self, name):
+		'''
+		Remove the style node added for *name*, if any.
+		'''
+		element = self.elements.pop(name, None)
+		if element is not None:
+			element.getparent().remove(element)
+
+	def remove_group(self, group):
+		'''
+		Remove the style nodes added to *group*, if any.
+		'''
+		for name in self.groups.pop(group, ()):
+			self.remove_style(name)
+
+	@instruments.timed('save_file')
+	def save_file(self, filename, styles=()):
+		'''
+		Save the etree to file. The file is written incrementally, one node
+		at a time, instead of serializing the whole tree to a string first.
 		
-if __name__ == '__main__':
-	generator = StyleGenerator()
-	generator.add_info("1001", "Wes' Test Theme", author="Wesley Hansen", description="Just testing my API")	
-	styles = {
-		'Python': {
-			'python:keyword': {
-				'foreground': '#161616',
-				'background': '#38FF6F',
-				'bold': False,
-				'italic': False,
-				'underline': False,
-				'strikethrough': False,
-			},
-			'python:declaration': {
-				'foreground': 'green',
-			}
-		}	
-	}
-	
-	generator.add_styles(styles)
-	
-	print etree.tostring(generator.tree.getroot(), pretty_print=True)
-	generator.save_file('test1.xml')
-	
+		*styles* (``iterable``) of more ``(name, config)`` tuples, see
+			:meth:`add_style`, streamed to the file after the styles of the
+			tree without being added to it. Fed from a generator, e.g.
+			:meth:`lib.stylesdb.GThemerDB.iter_scheme_styles` or the
+			``(style, config)`` pairs of
+			:meth:`lib.styles_model.StylesModel.iter_styles`, only one style
+			is in memory at a time.
+		
+		Returns (``int``) the number of <style> nodes written.
+		'''
+		assert self.tree is not None, "lxml.etree hasn't been set"
+		root = self.tree.getroot()
+		styles = iter(styles)
+		first = next(styles, None)
+		if first is None and not len(root):
+			# Nothing to stream; an empty root is written self-closed.
+			with open(filename, 'wb') as fp:
+				fp.write(etree.tostring(self.tree, pretty_print=True))
+			instruments.count('save_file.styles', 0)
+			return 0
+		if first is not None:
+			styles = chain((first,), styles)
+		count = 0
+		with open(filename, 'wb') as fp:
+			with etree.xmlfile(fp) as xf:
+				with xf.element(root.tag, OrderedDict(root.items())):
+					for node in root:
+						xf.write(self.indent)
+						xf.write(node)
+						count += node.tag == 'style'
+					for name, config in styles:
+						element = etree.Element('style')
+						element.set('name', name)
+						self._set_attributes(element, config)
+						xf.write(self.indent)
+						xf.write(element)
+						count += 1
+					xf.write("\n")
+			fp.write("\n")
+		instruments.count('save_file.styles', count)
+		return count
+
+
+def save_styles(model, filename, info, generator=None, saved_info=None):
+	'''
+	Save the styles of a StylesModel to *filename*. The first save builds a
+	StyleGenerator from every style of *model*, later ones only patch the
+	*generator* of the last save with the styles changed since.
 	
+	*model* (``StylesModel``) or any object with its ``iter_styles``,
+		``has_changes`` and ``take_changes``.
 	
+	*info* (``dict``) with the ``id``, ``name``, ``author``, ``description``
+		and ``version`` of the scheme.
 	
+	*generator* (``StyleGenerator``) the last save returned, ``None`` to
+		build a new one.
 	
+	*saved_info* (``dict``) is the *info* of the last save. Nothing is
+		written if neither it nor the styles changed.
 	
-		
-
+	Returns (``StyleGenerator``) the generator to pass to the next save.
+	'''
+	if generator is None:
+		model.take_changes()
+		generator = StyleGenerator()
+		for lang, style, config in model.iter_styles():
+			generator.add_style(style, config, lang)
+	elif model.has_changes():
+		removed_groups, styles = model.take_changes()
+		for lang in removed_groups:
+			generator.remove_group(lang)
+		for lang, style, config in styles:
+			if config is None:
+				generator.remove_style(style)
+			else:
+				generator.update_style(style, config, lang)
+	elif info == saved_info:
+		return generator
+	generator.add_info(info['id'], info['name'],
+	                   author=info['author'],
+	                   description=info['description'],
+	                   version=info['version'])
+	generator.save_file(filename)
+	return generator
@@ -24,14 +24,176 @@ __date__ = "11/03/2012 07:17:14 PM"
 __version__ = "0.1"
 __status__ = "Prototype"
 
-import pprint
+from array import array
+from itertools import repeat
+
+from lib.language_catalog import default_catalog
+
+# FLAG_BITS - The bit each boolean text flag takes in a packed flags value.
+FLAG_BITS = (('bold', 1), ('italic', 2), ('underline', 4), ('strikethrough', 8))
+
+def pack_flags(config):
+	'''
+	Pack the boolean text flags of *config* into an ``int``.
+	
+	*config* (``dict``) or ``GThemerRow`` with the ``bold``, ``italic``,
+		``underline`` and ``strikethrough`` flags.
+	'''
+	flags = 0
+	for key, bit in FLAG_BITS:
+		if config[key] == True:
+			flags |= bit
+	return flags
+
+def unpack_flags(flags):
+	'''
+	Returns (``dict``) the boolean text flags packed into *flags*.
+	'''
+	return {key: bool(flags & bit) for key, bit in FLAG_BITS}
+
+def pack_flag_pair(config):
+	'''
+	Pack the text flags of *config* into a ``(flags_set, flags)`` pair of
+	``int``: the bits of the flags that are set at all, and their values.
+	Unlike :func:`pack_flags` this keeps an unset flag apart from a false one.
+	
+	*config* (``dict``) with any of the ``bold``, ``italic``, ``underline``
+		and ``strikethrough`` flags as ``bool``, ``'true'``/``'false'`` or
+		``None``.
+	'''
+	flags_set = 0
+	flags = 0
+	for key, bit in FLAG_BITS:
+		value = _flag_value(config.get(key))
+		if value is not None:
+			flags_set |= bit
+			if value:
+				flags |= bit
+	return flags_set, flags
+
+def unpack_flag_pair(flags_set, flags):
+	'''
+	Returns (``dict``) the text flags of a ``(flags_set, flags)`` pair, see
+	:func:`pack_flag_pair`, ``None`` for the unset ones.
+	'''
+	return {key: bool(flags & bit) if flags_set & bit else None for key, bit in FLAG_BITS}
+
+def _flag_value(value):
+	'''
+	Returns *value* as a text flag: ``None`` when unset, otherwise ``bool``.
+	Strings read from a scheme file are ``'true'`` or ``'false'``.
+	'''
+	if value is None:
+		return None
+	if isinstance(value, basestring):
+		return value.lower() == 'true'
+	return bool(value)
+
+
+class StyleTable(object):
+	'''
+	Columnar storage for style attributes. Every style is a slot, an index
+	into dense arrays: colors are stored as indices into a table of interned
+	color strings and the four text flags are packed into one byte, the low
+	nibble saying which flags are set and the high nibble their values. An
+	unset style takes nine bytes: two four byte ``'I'`` color indices and the
+	flags byte.
+	'''
+	__slots__ = ('colors', 'color_ids', 'foreground', 'background', 'flags')
+
+	def __init__(self):
+		# colors - The interned color strings, index 0 means unset.
+		self.colors = [None]
+		self.color_ids = {}
+		self.foreground = array('I')
+		self.background = array('I')
+		self.flags = array('B')
+
+	def __len__(self):
+		return len(self.flags)
+
+	def add(self, count=1):
+		'''
+		Add *count* unset styles, returns the slot of the first one.
+		'''
+		slot = len(self.flags)
+		self.foreground.extend(repeat(0, count))
+		self.background.extend(repeat(0, count))
+		self.flags.extend(repeat(0, count))
+		return slot
+
+	def _color_id(self, color):
+		if color is None:
+			return 0
+		color_id = self.color_ids.get(color)
+		if color_id is None:
+			color_id = self.color_ids[color] = len(self.colors)
+			self.colors.append(color)
+		return color_id
+
+	def set(self, slot, config):
+		'''
+		Update the attributes of *slot* that are keys of *config*, a value of
+		``None`` unsets the attribute.
+		'''
+		if 'foreground' in config:
+			self.foreground[slot] = self._color_id(config['foreground'])
+		if 'background' in config:
+			self.background[slot] = self._color_id(config['background'])
+		flags = self.flags[slot]
+		for key, bit in FLAG_BITS:
+			if key in config:
+				value = _flag_value(config[key])
+				if value is None:
+					flags &= ~(bit | bit << 4)
+				elif value:
+					flags |= bit | bit << 4
+				else:
+					flags = (flags | bit) & ~(bit << 4)
+		self.flags[slot] = flags
+
+	def clear(self, slot):
+		self.foreground[slot] = 0
+		self.background[slot] = 0
+		self.flags[slot] = 0
+
+	def is_set(self, slot):
+		return bool(self.foreground[slot] or self.background[slot] or self.flags[slot])
+
+	def get(self, slot):
+		'''
+		Returns (``dict``) the attributes of *slot*, ``None`` where unset.
+		'''
+		flags = self.flags[slot]
+		config = unpack_flag_pair(flags & 0xf, flags >> 4)
+		config['foreground'] = self.colors[self.foreground[slot]]
+		config['background'] = self.colors[self.background[slot]]
+		return config
+
+	def get_color(self, slot, attr):
+		'''
+		Returns (``str``) the *attr* color of *slot*, ``None`` if unset.
+
+		*attr* (``str``) is ``'foreground'`` or ``'background'``.
+		'''
+		column = self.foreground if attr == 'foreground' else self.background
+		return self.colors[column[slot]]
+
+	def get_flags(self, slot):
+		'''
+		Returns (``int``) the text flags of *slot* that are true, packed the
+		way :func:`pack_flags` packs them.
+		'''
+		return self.flags[slot] >> 4
 
-from gi.repository import GtkSource
-from lxml import etree
 
 class GThemerStyles:
 	'''
 	Underlying data structure used by GThemer to create a custom theme (xml file)
+	
+	Languages and style names are interned and every style is a slot in a
+	:class:`StyleTable`, so the thousands of mostly unset styles of the
+	catalog cost a few bytes each.
 	'''
 	# global_styles - List of all appropriate global styles keys that can
 	# exist in the current GtkSourceView styles definition. Currently I can't
@@ -48,12 +210,19 @@ class GThemerStyles:
 	# globals_key - The key at which the globals styles are located in the styles structure
 	globals_key = "__globals"
 	
-	def __init__(self):
+	def __init__(self, catalog=None):
 		'''
 		Retrieve the languages and ids from the GtkSource, and build the initial
 		shape of the data structure.
+		
+		*catalog* (``LanguageCatalog``) is the language catalog to build the
+			styles from, defaults to the shared catalog.
 		'''
-		self.styles = {}
+		self.catalog = catalog if catalog is not None else default_catalog()
+		self.table = StyleTable()
+		# languages - mapping of each language to its ``(name, slots)``, where
+		# slots maps the language's style names to their StyleTable slot.
+		self.languages = {}
 		self.author = ""
 		self.name = ""
 		self.scheme_id = ""
@@ -61,43 +230,35 @@ class GThemerStyles:
 		self.description = ""
 		self._init_styles()
 		self._init_globals()
-		self.language_map = dict(zip([lang.get('name', blah) for blah, lang in self.styles.iteritems()],[lang for lang in self.styles]))
-		
-		pprint.pprint(self.styles)
+		self.language_map = {name: lang for lang, (name, _) in self.languages.iteritems()}
 		
 	def _init_globals(self):
 		'''
 		Add the globals config structure to the underlying data structure.
 		'''
-		self.styles[self.globals_key] = {}
-		for style in self.global_styles:
-			global_style = {attr: None for attr in self.style_attrs}
-			self.styles[self.globals_key].update({style:global_style})
+		self._add_language(self.globals_key, self.globals_key, self.global_styles)
 		
 	def _init_styles(self):
 		'''
-		Determine the available languages and styles from GtkSource language manager
+		Determine the available languages and styles from the language catalog
 		and build the initial underlying data structure
 		'''
-		manager = GtkSource.LanguageManager()
-		languages = manager.get_language_ids()
-		for lang in languages:
-			lang_config = {}
-			style_ids = manager.get_language(lang).get_style_ids()
-			name = manager.get_language(lang).get_name()
-			if name == "" or style_ids == []:
-				print("**GThemer Warning: could not add language: {} with style_ids: {}".format(repr(name), repr(style_ids)))
-				continue
-			style_dict = None
-			for style in style_ids:
-				#print("Scheme: {}".format(style))
-				style_dict = {attr:None for attr in self.style_attrs}
-				lang_config[style] = style_dict
-			self.styles[lang] = {
-				'styles': lang_config,
-				'name': name,
-				'scheme': lang,
-			}
+		for lang, name, style_ids in self.catalog:
+			self._add_language(lang, name, style_ids)
+
+	def _add_language(self, lang, name, style_ids):
+		style_ids = [intern(str(style)) for style in style_ids]
+		first = self.table.add(len(style_ids))
+		slots = dict(zip(style_ids, xrange(first, first + len(style_ids))))
+		self.languages[intern(str(lang))] = (name, slots)
+
+	def _slot(self, language, style_name):
+		if language not in self.languages:
+			raise LanguageUndefinedError("{} is not defined!".format(repr(language)))
+		slot = self.languages[language][1].get(style_name)
+		if slot is None:
+			raise StyleUndefinedError("style: {} is not defined for language: {}!".format(repr(style_name), repr(language)))
+		return slot
 
 	def set_style(self, language, style_name, style_config):
 		'''
@@ -108,7 +269,7 @@ class GThemerStyles:
 		
 		*style_name* (``str``) is the name of the style you're setting.
 		
-		*style_config* (``dicdett``) is a dictionary of formatting options:
+		*style_config* (``dict``) is a dictionary of formatting options:
 		
 			*foreground* (``str``) is the foreground color of the text.
 			
@@ -122,19 +283,20 @@ class GThemerStyles:
 			
 			*bold* (``bool``) if the text is bolded or not.
 		'''
-		if language not in self.styles:
-			raise LanguageUndefinedError("{} is not defined!".format(repr(lanugage)))
-		if style_name not in self.styles[language]['styles'].keys():
-			raise StyleUndefinedError("style: {} is not defined for language: {}!".format(repr(style_name), repr(language)))
-		self.styles[language]['styles'][style_name].update(style_config)
+		self.table.set(self._slot(language, style_name), style_config)
 
 	def get_styles(self, language):
 		'''
 		Get styles config for a given language
 		'''
-		if language not in self.styles:
+		if language not in self.languages:
 			raise LanguageUndefinedError("{} is not defined!".format(repr(language)))
-		return self.styles[language]
+		name, slots = self.languages[language]
+		return {
+			'styles': {style_name: self.table.get(slot) for style_name, slot in slots.iteritems()},
+			'name': name,
+			'scheme': language,
+		}
 
 	def get_style(self, language, style_name):
 		'''
@@ -145,15 +307,11 @@ class GThemerStyles:
 		
 		*style_name* (``str``) is the name of the style you're retrieving.
 		'''
-		if language not in self.styles:
-			raise LanguageUndefinedError("{} is not defined!".format(repr(lanugage)))
-		if style_name not in self.styles[language]['styles'].keys():
-			raise StyleUndefinedError("style: {} is not defined for language: {}!".format(repr(style_name), repr(language)))
-		return dict(self.styles[language]['styles'][style_name])
+		return self.table.get(self._slot(language, style_name))
 	
 	def set_global_styles(self, style_name, style_config):
 		'''
-		Update the global styles.
+		Replace a global style.
 		
 		*style_name* (``str``) is the name of the style you're setting.
 		
@@ -171,9 +329,11 @@ class GThemerStyles:
 			
 			*bold* (``bool``) if the text is bolded or not.
 		'''
-		if style_name not in self.styles[self.globals_key]:
+		slot = self.languages[self.globals_key][1].get(style_name)
+		if slot is None:
 			raise StyleUndefinedError("style: {} is not defined!".format(repr(style_name)))
-		self.styles[self.globals_key].update({style_name: style_config})
+		self.table.clear(slot)
+		self.table.set(slot, style_config)
 	
 	def get_global_styles(self, global_style):
 		'''
@@ -181,9 +341,10 @@ class GThemerStyles:
 		
 		*global_style* (``str``) is a global style name.
 		'''
-		if global_style not in self.styles[self.globals_key]:
-			raise
-		return dict(self.styles[self.globals_key][global_style])
+		slot = self.languages[self.globals_key][1].get(global_style)
+		if slot is None:
+			raise StyleUndefinedError("style: {} is not defined!".format(repr(global_style)))
+		return self.table.get(slot)
 
 	def iter_styles(self):
 		'''
@@ -191,10 +352,24 @@ class GThemerStyles:
 		
 		Yields *style_config* (``dict``) 
 		'''
-		for language, style_config in self.styles.iteritems():
+		for language in self.languages:
+			if language == self.globals_key:
+				continue
+			yield self.get_styles(language)
+
+	def iter_set_styles(self):
+		'''
+		Get every language style that has at least one attribute set, without
+		building the configs of unset styles.
+		
+		Yields ``(language, style_name, style_config)`` tuples.
+		'''
+		for language, (_, slots) in self.languages.iteritems():
 			if language == self.globals_key:
 				continue
-			yield style_config
+			for style_name, slot in slots.iteritems():
+				if self.table.is_set(slot):
+					yield language, style_name, self.table.get(slot)
 
 	def iter_globals(self):
 		'''
@@ -202,21 +377,21 @@ class GThemerStyles:
 		
 		Yields *styles_config* (``dict``)
 		'''
-		for global_name, style_config in self.styles[self.globals_key].iteritems():
-			yield style_config
+		for slot in self.languages[self.globals_key][1].itervalues():
+			yield self.table.get(slot)
 
 	def iter_global_names(self):
-		for global_name, _ in self.styles[self.globals_key].iteritems():
+		for global_name in self.languages[self.globals_key][1]:
 			yield global_name
 
 	def iter_language_names(self):
 		'''
 		Retrieve the title/name of each language in the styles dict
 		'''
-		for language, config in self.styles.iteritems():
+		for language, (name, _) in self.languages.iteritems():
 			if language == self.globals_key:
 				continue
-			yield config['name']
+			yield name
 
 	def write_to_file(self, filename):
 		'''
@@ -224,6 +399,8 @@ class GThemerStyles:
 		
 		*filename* (``str``) is a filepath to write the xml structure to.
 		'''
+		from lxml import etree
+
 		root = etree.Element("style-scheme")
 		tree = etree.ElementTree(root)
 		
@@ -235,33 +412,45 @@ class GThemerStyles:
 		root.set('description', self.description)
 		
 		# Set styles.
-		for language, style in self.styles.iteritems():
-			for style_name, style_config in style.iteritems():
-				if all(lang_style is None for lang_style in style_config['styles']):
-					continue
-				element = etree.Element('style')
-				element.set('name', style_name)
-				for attr, value in definition.iteritems():
-					element.set(attr, str(value))
-				root.append(element)
+		set_globals = [(name, self.get_global_styles(name)) for name in self.iter_global_names()]
+		set_styles = [(style_name, config) for _, style_name, config in self.iter_set_styles()]
+		for style_name, config in sorted(set_globals) + sorted(set_styles):
+			if all(value is None for value in config.itervalues()):
+				continue
+			element = etree.SubElement(root, 'style')
+			element.set('name', style_name)
+			for attr, value in config.iteritems():
+				if value is not None:
+					element.set(attr, str(value).lower() if isinstance(value, bool) else value)
 		
 		# Save file.		
-		self.tree.write(filename, pretty_print=True)
+		tree.write(filename, pretty_print=True)
 
-class GThemerRow:
+class GThemerRow(object):
 	'''
 	A data structure used to transfer data between the GThemerStyles data structure
 	and the GtkTreeView's TreeModel.
+	
+	The row is stored as a plain list in TreeStore column order, so converting
+	to and from TreeStore rows is a single list copy.
 	'''
+	__slots__ = ('values',)
 	
+	# definition holds the display markup of the style_id column.
 	row_keys = ('definition', 'foreground_data', 'foreground_display',
 	            'background_data', 'background_display', 'bold', 'italic',
-	            'underline', 'strikethrough', 'editable')
+	            'underline', 'strikethrough', 'editable', 'style_id')
 
 	str_keys = ('definition', 'foreground_data', 'foreground_display',
-	            'background_data', 'background_display')
+	            'background_data', 'background_display', 'style_id')
 
 	bool_keys = ('bold', 'italic', 'underline', 'strikethrough', 'editable')
+
+	# column_index - The TreeStore column of each key.
+	column_index = dict(zip(row_keys, range(len(row_keys))))
+
+	# default_values - The values of an empty row.
+	default_values = tuple(['' if key in str_keys else False for key in row_keys])
 		
 	def __init__(self, *args, **kwargs):
 		'''
@@ -270,44 +459,63 @@ class GThemerRow:
 		if args and kwargs:
 			raise InvalidArgsError("positional and keyword arguments passed, only one may be passed at a time!")
 
-		# row_dict - The underlying dictionary
-		self.row_dict = {}
-		
 		if args:
 			if len(args) != len(self.row_keys):
 				raise InvalidArgsLengthError("Args length[{}] != {}".format(len(args), len(self.row_keys)))
-			self.row_dict = {key:args[idx] for idx, key in enumerate(self.row_keys)}
+			self.values = list(args)
 		elif kwargs:
-			self.row_dict = {key:kwargs.get(key, None) for key in self.row_keys}
+			self.values = [kwargs.get(key, None) for key in self.row_keys]
 		else:
-			self.row_dict = {key:'' if key in self.str_keys else False for key in self.row_keys}
+			self.values = list(self.default_values)
+
+	@classmethod
+	def from_row(cls, row):
+		'''
+		Create a GThemerRow from a TreeStore row, or any sequence of values in
+		column order.
+		'''
+		values = list(row)
+		if len(values) != len(cls.row_keys):
+			raise InvalidArgsLengthError("Args length[{}] != {}".format(len(values), len(cls.row_keys)))
+		new_row = cls.__new__(cls)
+		new_row.values = values
+		return new_row
 
 	def __iter__(self):
-		for item in self.get_row():
-			yield item
+		return iter(self.values)
 			
 	def __setitem__(self, key, value):
-		if key not in self.row_keys:
+		try:
+			self.values[self.column_index[key]] = value
+		except KeyError:
 			raise KeyError("{} is not a valid key in GThemerRow.".format(repr(key)))
-		self.row_dict[key] = value
 
 	def __getitem__(self, key):
-		return self.row_dict[key]
+		return self.values[self.column_index[key]]
 
 	def __len__(self):
 		return len(self.row_keys)
 	
 	def get_row(self):
 		'''
-		Returns the row as a list
+		Returns the row as a list. This is the row's own storage, so it must
+		be copied before being changed independently of the row.
 		'''
-		return [self.row_dict[key] for key in self.row_keys]
+		return self.values
 
 	def get_row_dict(self):
-		return dict(self.row_dict)
+		return dict(zip(self.row_keys, self.values))
+
+	@classmethod
+	def index_of(cls, column):
+		return cls.column_index[column]
 
-	def index_of(self, column):
-		return list(self.row_keys).index(column)
+	@classmethod
+	def column_types(cls):
+		'''
+		Returns the column types of a TreeStore holding GThemerRows.
+		'''
+		return tuple(str if key in cls.str_keys else bool for key in cls.row_keys)
 
 		
 		
@@ -0,0 +1,488 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+The tree model shown by the StylesTreeView.
+
+StylesModel implements Gtk.TreeModel directly on top of a StyleTable: the
+rows only hold style slots, every cell is computed when the view asks for it
+and writes to a cell go straight to the table. Groups are languages, their
+children the styles added to them.
+"""
+
+import random
+
+from gi.repository import GObject, Gtk
+
+from lib.styles import GThemerRow, StyleTable, pack_flag_pair, unpack_flag_pair
+from lib.markup import style_cell
+
+# PLACEHOLDER - The slot of the placeholder child of an unexpanded group.
+PLACEHOLDER = -1
+
+class _Group(object):
+	'''
+	A language group: its title and the style ids and StyleTable slots of
+	its children, in order.
+	'''
+	__slots__ = ('title', 'styles', 'slots', 'index', 'pending')
+
+	def __init__(self, title):
+		self.title = title
+		self.styles = []
+		self.slots = []
+		# index - mapping of the style ids to their child position, the
+		# placeholder left out.
+		self.index = {}
+		# pending - sources of styles not added yet, see StylesModel.add_lazy_group.
+		self.pending = None
+
+
+def _style_config(config):
+	'''
+	Returns (``dict``) parsed attributes *config* the way
+	:meth:`StyleTable.get` returns them.
+	'''
+	style = unpack_flag_pair(*pack_flag_pair(config))
+	style['foreground'] = config.get('foreground') or None
+	style['background'] = config.get('background') or None
+	return style
+
+
+class StylesModel(GObject.Object, Gtk.TreeModel):
+	'''
+	A two level Gtk.TreeModel of language groups and their styles with the
+	columns of :class:`GThemerRow`.
+	'''
+
+	# placeholder_text - Shown in language groups that haven't been expanded.
+	placeholder_text = "Loading..."
+
+	column_types = GThemerRow.column_types()
+	# style_columns - The columns a write goes through to, and the StyleTable
+	# attribute they hold.
+	style_columns = {
+		'foreground_data': 'foreground',
+		'background_data': 'background',
+		'bold': 'bold',
+		'italic': 'italic',
+		'underline': 'underline',
+		'strikethrough': 'strikethrough',
+	}
+
+	def __init__(self, table=None):
+		'''
+		*table* (``StyleTable``) holds the attributes of the styles, a new
+			one by default.
+		'''
+		GObject.Object.__init__(self)
+		self.table = table if table is not None else StyleTable()
+		self.groups = []
+		# group_index - mapping of group titles to their position.
+		self.group_index = {}
+		self.stamp = random.randint(1, 2 ** 31 - 1)
+		# changed - ``(title, style_id)`` of the styles added, edited or removed
+		# since the last take_changes.
+		self.changed = set()
+		# changed_groups - titles of the groups that were given more lazy
+		# styles since then, see add_lazy_group.
+		self.changed_groups = set()
+		# removed_groups - titles of the groups removed since then.
+		self.removed_groups = set()
+
+	# Building the model.
+
+	def clear(self):
+		'''
+		Remove every group. Nothing of it is recorded as a change, whatever
+		comes next starts from scratch.
+		'''
+		while self.groups:
+			self.groups.pop()
+			self.row_deleted(Gtk.TreePath((len(self.groups),)))
+		self.group_index = {}
+		self.table = StyleTable()
+		self.changed = set()
+		self.changed_groups = set()
+		self.removed_groups = set()
+
+	def has_group(self, title):
+		return title in self.group_index
+
+	def group_iter(self, title):
+		'''
+		Returns the Gtk.TreeIter of group *title*, adding the group first if
+		it doesn't exist yet.
+		'''
+		if title not in self.group_index:
+			self.group_index[title] = len(self.groups)
+			self.groups.append(_Group(title))
+			path = (len(self.groups) - 1,)
+			self.row_inserted(Gtk.TreePath(path), self._iter(path))
+		return self._iter((self.group_index[title],))
+
+	def add_styles(self, title, styles):
+		'''
+		Add styles to group *title*, skipping the ones it already has.
+
+		*styles* (``iterable``) of ``(style_id, config)`` tuples, where
+			*config* (``dict``) is the attributes of the style as
+			:meth:`StyleTable.set` takes them, or ``None``.
+		'''
+		self._add_styles(title, styles, self.changed)
+
+	def _add_styles(self, title, styles, changed):
+		self.group_iter(title)
+		position = self.group_index[title]
+		group = self.groups[position]
+		for style_id, config in styles:
+			if style_id in group.index:
+				continue
+			slot = self.table.add()
+			if config:
+				self.table.set(slot, config)
+			group.index[style_id] = len(group.styles)
+			group.styles.append(style_id)
+			group.slots.append(slot)
+			changed.add((title, style_id))
+			path = (position, len(group.styles) - 1)
+			self.row_inserted(Gtk.TreePath(path), self._iter(path))
+			if len(group.styles) == 1:
+				self.row_has_child_toggled(Gtk.TreePath((position,)), self._iter((position,)))
+
+	def add_lazy_group(self, title, styles):
+		'''
+		Add group *title* with a placeholder child, its styles are only added
+		by :meth:`fill_group`, when it is expanded.
+
+		*styles* (``list``) of ``(style_id, config)`` tuples, see
+			:meth:`add_styles`, or a ``callable`` returning them.
+		'''
+		if self.has_group(title) and self.groups[self.group_index[title]].pending is None:
+			self.add_styles(title, styles() if callable(styles) else styles)
+			return
+		self.group_iter(title)
+		position = self.group_index[title]
+		group = self.groups[position]
+		if group.pending is None:
+			group.pending = []
+			group.styles.append('')
+			group.slots.append(PLACEHOLDER)
+			path = (position, len(group.styles) - 1)
+			self.row_inserted(Gtk.TreePath(path), self._iter(path))
+			if len(group.styles) == 1:
+				self.row_has_child_toggled(Gtk.TreePath((position,)), self._iter((position,)))
+		group.pending.append(styles)
+		self.changed_groups.add(title)
+
+	def fill_group(self, title):
+		'''
+		Add the styles of a group added with :meth:`add_lazy_group`, replacing
+		its placeholder.
+
+		Returns (``bool``) whether there was anything to add.
+		'''
+		if title not in self.group_index:
+			return False
+		group = self.groups[self.group_index[title]]
+		if group.pending is None:
+			return False
+		pending, group.pending = group.pending, None
+		for styles in pending:
+			# The styles were already there, only not loaded.
+			self._add_styles(title, styles() if callable(styles) else styles, set())
+		# Removed last, so the group never loses all its children and collapses.
+		self._remove_child(self.group_index[title], group.slots.index(PLACEHOLDER))
+		return True
+
+	def remove_style(self, title, style_id):
+		'''
+		Remove style *style_id* from group *title*.
+		'''
+		position = self.group_index[title]
+		self._remove_child(position, self.groups[position].index[style_id])
+		self.changed.add((title, style_id))
+
+	def _remove_child(self, position, child):
+		group = self.groups[position]
+		if group.slots[child] != PLACEHOLDER:
+			del group.index[group.styles[child]]
+		del group.styles[child]
+		del group.slots[child]
+		for idx in xrange(child, len(group.styles)):
+			if group.slots[idx] != PLACEHOLDER:
+				group.index[group.styles[idx]] = idx
+		self.row_deleted(Gtk.TreePath((position, child)))
+		if not group.styles:
+			self.row_has_child_toggled(Gtk.TreePath((position,)), self._iter((position,)))
+
+	def remove_group(self, title):
+		'''
+		Remove group *title* and all of its styles. The styles it hasn't
+		loaded yet are never read, the group is recorded as removed as a
+		whole instead, see :meth:`take_changes`.
+		'''
+		position = self.group_index.pop(title)
+		self.removed_groups.add(title)
+		self.changed_groups.discard(title)
+		self.changed = set(change for change in self.changed if change[0] != title)
+		del self.groups[position]
+		for idx in xrange(position, len(self.groups)):
+			self.group_index[self.groups[idx].title] = idx
+		self.row_deleted(Gtk.TreePath((position,)))
+
+	# Reading the model.
+
+	def style_ids(self, title):
+		'''
+		Returns (``list``) the style ids of group *title*, without loading an
+		unexpanded group.
+		'''
+		if title not in self.group_index:
+			return []
+		group = self.groups[self.group_index[title]]
+		return [style_id for style_id, slot in zip(group.styles, group.slots) if slot != PLACEHOLDER]
+
+	def has_style(self, title, style_id):
+		'''
+		Returns (``bool``) whether group *title* has style *style_id*, without
+		loading an unexpanded group.
+		'''
+		position = self.group_index.get(title)
+		return position is not None and style_id in self.groups[position].index
+
+	def style_iter(self, title, style_id):
+		'''
+		Returns the Gtk.TreeIter of style *style_id* of group *title*, ``None``
+		if it isn't in the model.
+		'''
+		position = self.group_index.get(title)
+		if position is None:
+			return None
+		child = self.groups[position].index.get(style_id)
+		if child is None:
+			return None
+		return self._iter((position, child))
+
+	def get_style(self, treeiter):
+		'''
+		Returns ``(title, style_id, config)`` of the style row at *treeiter*,
+		``None`` for group rows and placeholders.
+		'''
+		position, child = self._indices(treeiter)
+		if child is None:
+			return None
+		group = self.groups[position]
+		slot = group.slots[child]
+		if slot == PLACEHOLDER:
+			return None
+		return group.title, group.styles[child], self.table.get(slot)
+
+	def iter_styles(self):
+		'''
+		Get every style of every group, reading unexpanded groups straight
+		from their sources.
+
+		Yields ``(title, style_id, config)`` tuples.
+		'''
+		for group in self.groups:
+			for style_id, config in self._iter_group(group):
+				yield group.title, style_id, config
+
+	def _iter_group(self, group):
+		for style_id, slot in zip(group.styles, group.slots):
+			if slot != PLACEHOLDER:
+				yield style_id, self.table.get(slot)
+		if group.pending is not None:
+			seen = set(group.index)
+			for styles in group.pending:
+				for style_id, config in (styles() if callable(styles) else styles):
+					if style_id not in seen:
+						seen.add(style_id)
+						yield style_id, _style_config(config or {})
+
+	def has_changes(self):
+		'''
+		Returns (``bool``) whether any style was added, edited or removed
+		since the last :meth:`take_changes`.
+		'''
+		return bool(self.changed or self.changed_groups or self.removed_groups)
+
+	def take_changes(self):
+		'''
+		Get the groups removed and the styles added, edited or removed since
+		the last call and start tracking changes anew.
+
+		Returns (``tuple``) the ``(removed_groups, styles)``: a ``list`` of the
+		titles of the removed groups, whose styles are all gone unless they
+		are in *styles* again, and a ``list`` of ``(title, style_id, config)``
+		tuples, *config* being ``None`` for the styles that were removed.
+		'''
+		changed, self.changed = self.changed, set()
+		changed_groups, self.changed_groups = self.changed_groups, set()
+		removed_groups, self.removed_groups = self.removed_groups, set()
+		styles = {}
+		titles = changed_groups.union(title for title, style_id in changed)
+		for title in titles:
+			if title in self.group_index:
+				styles[title] = dict(self._iter_group(self.groups[self.group_index[title]]))
+		changes = {}
+		for title in changed_groups:
+			for style_id, config in styles.get(title, {}).iteritems():
+				changes[style_id] = (title, style_id, config)
+		for title, style_id in changed:
+			if style_id not in changes:
+				changes[style_id] = (title, style_id, styles.get(title, {}).get(style_id))
+		return sorted(removed_groups), [changes[style_id] for style_id in sorted(changes)]
+
+	def row_values(self, treeiter):
+		'''
+		Returns (``list``) the values of every column of the row at *treeiter*.
+		'''
+		return [self.do_get_value(treeiter, column) for column in xrange(len(self.column_types))]
+
+	def set_value(self, treeiter, column, value):
+		'''
+		Write *value* to *column* of the style row at *treeiter*. Writes to
+		the colors and text flags go through to the StyleTable, the other
+		columns are computed from them and can't be set.
+		'''
+		position, child = self._indices(treeiter)
+		if child is None:
+			return
+		slot = self.groups[position].slots[child]
+		attr = self.style_columns.get(GThemerRow.row_keys[column])
+		if attr is None or slot == PLACEHOLDER:
+			return
+		if attr in ('foreground', 'background'):
+			self.table.set(slot, {attr: value or None})
+		else:
+			self.table.set(slot, {attr: True if value else None})
+		self.changed.add((self.groups[position].title, self.groups[position].styles[child]))
+		path = (position, child)
+		self.row_changed(Gtk.TreePath(path), self._iter(path))
+
+	def reset_style(self, treeiter):
+		'''
+		Unset every attribute of the style row at *treeiter*.
+		'''
+		position, child = self._indices(treeiter)
+		if child is None or self.groups[position].slots[child] == PLACEHOLDER:
+			return
+		self.table.clear(self.groups[position].slots[child])
+		self.changed.add((self.groups[position].title, self.groups[position].styles[child]))
+		path = (position, child)
+		self.row_changed(Gtk.TreePath(path), self._iter(path))
+
+	# Gtk.TreeModel implementation. A TreeIter holds the group position + 1
+	# in user_data and the child position + 1 in user_data2, 0 being NULL.
+
+	def _iter(self, indices):
+		treeiter = Gtk.TreeIter()
+		treeiter.stamp = self.stamp
+		treeiter.user_data = indices[0] + 1
+		treeiter.user_data2 = indices[1] + 1 if len(indices) > 1 else None
+		return treeiter
+
+	def _indices(self, treeiter):
+		position = (treeiter.user_data or 0) - 1
+		child = treeiter.user_data2
+		return position, None if not child else child - 1
+
+	def do_get_flags(self):
+		return Gtk.TreeModelFlags(0)
+
+	def do_get_n_columns(self):
+		return len(self.column_types)
+
+	def do_get_column_type(self, column):
+		return GObject.TYPE_STRING if self.column_types[column] is str else GObject.TYPE_BOOLEAN
+
+	def do_get_iter(self, path):
+		indices = path.get_indices()
+		if not indices or len(indices) > 2 or indices[0] >= len(self.groups):
+			return False, None
+		if len(indices) > 1 and indices[1] >= len(self.groups[indices[0]].styles):
+			return False, None
+		return True, self._iter(indices)
+
+	def do_get_path(self, treeiter):
+		position, child = self._indices(treeiter)
+		return Gtk.TreePath((position,) if child is None else (position, child))
+
+	def do_get_value(self, treeiter, column):
+		key = GThemerRow.row_keys[column]
+		position, child = self._indices(treeiter)
+		group = self.groups[position]
+		if child is None:
+			return group.title if key == 'definition' else GThemerRow.default_values[column]
+		slot = group.slots[child]
+		if slot == PLACEHOLDER:
+			return self.placeholder_text if key == 'definition' else GThemerRow.default_values[column]
+		value = style_cell(key, group.styles[child], self.table, slot)
+		return GThemerRow.default_values[column] if value is None else value
+
+	def do_iter_next(self, treeiter):
+		position, child = self._indices(treeiter)
+		if child is None:
+			if position + 1 >= len(self.groups):
+				return False
+			treeiter.user_data = position + 2
+		else:
+			if child + 1 >= len(self.groups[position].styles):
+				return False
+			treeiter.user_data2 = child + 2
+		return True
+
+	def do_iter_previous(self, treeiter):
+		position, child = self._indices(treeiter)
+		if child is None:
+			if position == 0:
+				return False
+			treeiter.user_data = position
+		else:
+			if child == 0:
+				return False
+			treeiter.user_data2 = child
+		return True
+
+	def do_iter_children(self, parent):
+		return self.do_iter_nth_child(parent, 0)
+
+	def do_iter_has_child(self, treeiter):
+		position, child = self._indices(treeiter)
+		return child is None and bool(self.groups[position].styles)
+
+	def do_iter_n_children(self, treeiter):
+		if treeiter is None:
+			return len(self.groups)
+		position, child = self._indices(treeiter)
+		return len(self.groups[position].styles) if child is None else 0
+
+	def do_iter_nth_child(self, parent, n):
+		if parent is None:
+			if n < len(self.groups):
+				return True, self._iter((n,))
+			return False, None
+		position, child = self._indices(parent)
+		if child is None and n < len(self.groups[position].styles):
+			return True, self._iter((position, n))
+		return False, None
+
+	def do_iter_parent(self, child):
+		position, child_position = self._indices(child)
+		if child_position is None:
+			return False, None
+		return True, self._iter((position,))
@@ -17,11 +17,19 @@ stylesdb is the database that contains all the styles information for the
 GThemer application.
 """
 
-import sys
 import os
+import time
 import sqlite3
 
-from gi.repository import GtkSource
+from lib.language_catalog import default_catalog
+from lib.styles import FLAG_BITS, pack_flag_pair, unpack_flag_pair
+from lib.timing import instruments
+
+# FETCH_SIZE - How many records the iterators of GThemerDB fetch at a time.
+FETCH_SIZE = 256
+
+# DEFAULT_DB_PATH - Where the application keeps its styles database.
+DEFAULT_DB_PATH = os.path.expanduser('~/.gthemer/default.db')
 
 CREATE_TABLE_LANGUAGES = """
 CREATE TABLE languages
@@ -67,6 +75,277 @@ CREATE TABLE globals
 CREATE UNIQUE INDEX globals_index ON globals (scheme);
 """
 
+CREATE_TABLE_SCHEMA_VERSION = """
+CREATE TABLE IF NOT EXISTS schema_version
+	(version INTEGER PRIMARY KEY,
+	 applied TEXT,
+	 seconds REAL
+	);
+"""
+
+# SCHEMA_UPGRADES - Scripts that bring a database created with the tables
+# above up to date, in order. The schema_version table has a row for every
+# upgrade that has been applied to a database, older databases counted them
+# in ``PRAGMA user_version``.
+SCHEMA_UPGRADES = (
+	# Languages and styles that are no longer installed are retired instead of
+	# deleted, so their formats survive a reinstall.
+	"""
+	ALTER TABLE languages ADD COLUMN retired INTEGER NOT NULL DEFAULT 0;
+	ALTER TABLE style_schemes ADD COLUMN retired INTEGER NOT NULL DEFAULT 0;
+	""",
+	# Formats and globals of imported themes live next to the ones being
+	# edited, which belong to theme 0.
+	"""
+	CREATE TABLE themes
+		(scheme_id TEXT,
+		 name TEXT,
+		 author TEXT,
+		 version TEXT,
+		 description TEXT,
+		 filename TEXT,
+		 theme_seq_id INTEGER PRIMARY KEY AUTOINCREMENT
+		);
+	CREATE UNIQUE INDEX themes_index ON themes (filename);
+	ALTER TABLE formats ADD COLUMN theme_seq_id INTEGER NOT NULL DEFAULT 0;
+	DROP INDEX format_index;
+	CREATE UNIQUE INDEX format_index ON formats (theme_seq_id, style_seq_id);
+	ALTER TABLE globals ADD COLUMN theme_seq_id INTEGER NOT NULL DEFAULT 0;
+	DROP INDEX globals_index;
+	CREATE UNIQUE INDEX globals_index ON globals (theme_seq_id, scheme);
+	""",
+	# The four nullable flag columns become a flags_set/flags bitmask pair,
+	# see lib.styles.pack_flag_pair: bold 1, italic 2, underline 4 and
+	# strikethrough 8.
+	"""
+	CREATE TABLE formats_flags
+		(style_seq_id INTEGER NOT NULL,
+		 foreground TEXT,
+		 background TEXT,
+		 flags_set INTEGER NOT NULL DEFAULT 0,
+		 flags INTEGER NOT NULL DEFAULT 0,
+		 theme_seq_id INTEGER NOT NULL DEFAULT 0
+		);
+	INSERT INTO formats_flags
+		(style_seq_id, foreground, background, flags_set, flags, theme_seq_id)
+	SELECT style_seq_id, foreground, background,
+	       (bold IS NOT NULL) | ((italic IS NOT NULL) << 1) |
+	       ((underline IS NOT NULL) << 2) | ((strikethrough IS NOT NULL) << 3),
+	       (IFNULL(bold, 0) != 0) | ((IFNULL(italic, 0) != 0) << 1) |
+	       ((IFNULL(underline, 0) != 0) << 2) | ((IFNULL(strikethrough, 0) != 0) << 3),
+	       theme_seq_id
+		FROM formats;
+	DROP TABLE formats;
+	ALTER TABLE formats_flags RENAME TO formats;
+	CREATE UNIQUE INDEX format_index ON formats (theme_seq_id, style_seq_id);
+	CREATE TABLE globals_flags
+		(scheme TEXT,
+		 background TEXT,
+		 foreground TEXT,
+		 flags_set INTEGER NOT NULL DEFAULT 0,
+		 flags INTEGER NOT NULL DEFAULT 0,
+		 theme_seq_id INTEGER NOT NULL DEFAULT 0
+		);
+	INSERT INTO globals_flags
+		(scheme, background, foreground, flags_set, flags, theme_seq_id)
+	SELECT scheme, background, foreground,
+	       (bold IS NOT NULL) | ((italic IS NOT NULL) << 1) |
+	       ((underline IS NOT NULL) << 2) | ((strikethrough IS NOT NULL) << 3),
+	       (IFNULL(bold, 0) != 0) | ((IFNULL(italic, 0) != 0) << 1) |
+	       ((IFNULL(underline, 0) != 0) << 2) | ((IFNULL(strikethrough, 0) != 0) << 3),
+	       theme_seq_id
+		FROM globals;
+	DROP TABLE globals;
+	ALTER TABLE globals_flags RENAME TO globals;
+	CREATE UNIQUE INDEX globals_index ON globals (theme_seq_id, scheme);
+	""",
+	# Covering indexes for the hot queries, see HOT_QUERIES.
+	"""
+	CREATE INDEX formats_covering_index
+		ON formats (theme_seq_id, style_seq_id, foreground, background, flags_set, flags);
+	CREATE INDEX style_schemes_language_index ON style_schemes (lang_seq_id, retired, style);
+	CREATE INDEX languages_retired_index ON languages (retired, scheme, title);
+	""",
+	# Themes are looked up by name.
+	"""
+	CREATE INDEX themes_name_index ON themes (name);
+	""",
+	# Imports are keyed on the file they came from, source, so themes saved
+	# to the same filename can sit next to them. Themes stored so far were
+	# keyed on their filename and keep it as their source.
+	"""
+	ALTER TABLE themes ADD COLUMN source TEXT;
+	UPDATE themes SET source = filename;
+	DROP INDEX themes_index;
+	CREATE INDEX themes_index ON themes (filename);
+	CREATE UNIQUE INDEX themes_source_index ON themes (source);
+	""",
+)
+
+# ITER_STYLES_QUERY - The formats of a theme of every installed style.
+ITER_STYLES_QUERY = """
+SELECT  style_schemes.style,
+		formats.foreground,
+		formats.background,
+		formats.flags_set,
+		formats.flags
+FROM formats
+	JOIN style_schemes
+	ON style_schemes.style_seq_id = formats.style_seq_id
+WHERE formats.theme_seq_id = ?
+  AND style_schemes.retired = 0;
+"""
+
+# ITER_LANGUAGE_STYLES_QUERY - The formats of a theme of the installed styles
+# of one language.
+ITER_LANGUAGE_STYLES_QUERY = """
+SELECT  style_schemes.style,
+		formats.foreground,
+		formats.background,
+		formats.flags_set,
+		formats.flags
+FROM languages
+	JOIN style_schemes
+	ON style_schemes.lang_seq_id = languages.lang_seq_id
+	JOIN formats
+	ON formats.style_seq_id = style_schemes.style_seq_id
+WHERE languages.scheme = ?
+  AND style_schemes.retired = 0
+  AND formats.theme_seq_id = ?;
+"""
+
+# ITER_STYLES_PAGE_QUERY - A page of ITER_STYLES_QUERY, the styles named
+# after a style in order.
+ITER_STYLES_PAGE_QUERY = ITER_STYLES_QUERY.rstrip().rstrip(';') + """
+  AND style_schemes.style > ?
+ORDER BY style_schemes.style
+LIMIT ?;
+"""
+
+# ITER_LANGUAGE_STYLES_PAGE_QUERY - A page of ITER_LANGUAGE_STYLES_QUERY.
+ITER_LANGUAGE_STYLES_PAGE_QUERY = ITER_LANGUAGE_STYLES_QUERY.rstrip().rstrip(';') + """
+  AND style_schemes.style > ?
+ORDER BY style_schemes.style
+LIMIT ?;
+"""
+
+# ITER_GLOBALS_QUERY - The global styles of a theme.
+ITER_GLOBALS_QUERY = """
+SELECT scheme,
+       background,
+       foreground,
+       flags_set,
+       flags
+FROM globals
+WHERE theme_seq_id = ?;
+"""
+
+# DIFF_FORMATS_QUERY - The styles whose formats differ between two themes. A
+# style a theme has no format for counts as unset.
+DIFF_FORMATS_QUERY = """
+SELECT  style_schemes.style,
+		a.foreground AS foreground_a,
+		a.background AS background_a,
+		IFNULL(a.flags_set, 0) AS flags_set_a,
+		IFNULL(a.flags, 0) AS flags_a,
+		b.foreground AS foreground_b,
+		b.background AS background_b,
+		IFNULL(b.flags_set, 0) AS flags_set_b,
+		IFNULL(b.flags, 0) AS flags_b
+FROM (SELECT style_seq_id FROM formats WHERE theme_seq_id = :a
+      UNION
+      SELECT style_seq_id FROM formats WHERE theme_seq_id = :b) AS ids
+	JOIN style_schemes
+	ON style_schemes.style_seq_id = ids.style_seq_id
+	LEFT JOIN formats AS a
+	ON a.theme_seq_id = :a AND a.style_seq_id = ids.style_seq_id
+	LEFT JOIN formats AS b
+	ON b.theme_seq_id = :b AND b.style_seq_id = ids.style_seq_id
+WHERE a.foreground IS NOT b.foreground
+   OR a.background IS NOT b.background
+   OR IFNULL(a.flags_set, 0) != IFNULL(b.flags_set, 0)
+   OR IFNULL(a.flags, 0) != IFNULL(b.flags, 0);
+"""
+
+# DIFF_GLOBALS_QUERY - The global styles that differ between two themes.
+DIFF_GLOBALS_QUERY = """
+SELECT  schemes.scheme AS style,
+		a.foreground AS foreground_a,
+		a.background AS background_a,
+		IFNULL(a.flags_set, 0) AS flags_set_a,
+		IFNULL(a.flags, 0) AS flags_a,
+		b.foreground AS foreground_b,
+		b.background AS background_b,
+		IFNULL(b.flags_set, 0) AS flags_set_b,
+		IFNULL(b.flags, 0) AS flags_b
+FROM (SELECT scheme FROM globals WHERE theme_seq_id = :a
+      UNION
+      SELECT scheme FROM globals WHERE theme_seq_id = :b) AS schemes
+	LEFT JOIN globals AS a
+	ON a.theme_seq_id = :a AND a.scheme = schemes.scheme
+	LEFT JOIN globals AS b
+	ON b.theme_seq_id = :b AND b.scheme = schemes.scheme
+WHERE a.foreground IS NOT b.foreground
+   OR a.background IS NOT b.background
+   OR IFNULL(a.flags_set, 0) != IFNULL(b.flags_set, 0)
+   OR IFNULL(a.flags, 0) != IFNULL(b.flags, 0);
+"""
+
+# ITER_LANGUAGES_QUERY - The installed languages.
+ITER_LANGUAGES_QUERY = """
+SELECT scheme,
+       title
+FROM languages
+WHERE retired = 0;
+"""
+
+# UPDATE_SET_CLAUSE - Sets the formats or globals columns of a style, taking
+# the parameters built by _update_params, so every update shares one
+# prepared statement.
+UPDATE_SET_CLAUSE = """
+	foreground = CASE WHEN ? THEN ? ELSE foreground END,
+	background = CASE WHEN ? THEN ? ELSE background END,
+	flags_set = (flags_set & ?) | ?,
+	flags = (flags & ?) | ?
+"""
+
+# UPDATE_FORMAT_QUERY - Updates the format being edited of a style.
+UPDATE_FORMAT_QUERY = """
+UPDATE formats
+SET {set_clause}
+WHERE formats.theme_seq_id = 0
+  AND formats.style_seq_id = (
+	SELECT style_schemes.style_seq_id
+		FROM style_schemes
+		JOIN languages
+			ON languages.lang_seq_id = style_schemes.lang_seq_id
+		WHERE languages.scheme = ?
+		  AND style_schemes.style = ?);
+""".format(set_clause=UPDATE_SET_CLAUSE)
+
+# UPDATE_GLOBAL_QUERY - Updates a global style being edited.
+UPDATE_GLOBAL_QUERY = """
+UPDATE globals
+SET {set_clause}
+WHERE scheme = ?
+  AND theme_seq_id = 0;
+""".format(set_clause=UPDATE_SET_CLAUSE)
+
+# HOT_QUERIES - The queries run while editing, with sample parameters, that
+# must be answered from indexes, see GThemerDB.full_scans.
+HOT_QUERIES = (
+	('iter_styles', ITER_STYLES_QUERY, (0,)),
+	('iter_styles(language)', ITER_LANGUAGE_STYLES_QUERY, ('python', 0)),
+	('iter_styles(after, limit)', ITER_STYLES_PAGE_QUERY, (0, 'python:keyword', 100)),
+	('iter_styles(language, after, limit)', ITER_LANGUAGE_STYLES_PAGE_QUERY, ('python', 0, 'python:keyword', 100)),
+	('iter_globals', ITER_GLOBALS_QUERY, (0,)),
+	('diff_themes(formats)', DIFF_FORMATS_QUERY, {'a': 0, 'b': 1}),
+	('diff_themes(globals)', DIFF_GLOBALS_QUERY, {'a': 0, 'b': 1}),
+	('iter_languages', ITER_LANGUAGES_QUERY, ()),
+	('update_format', UPDATE_FORMAT_QUERY, (1, None, 1, None, 0, 0, 0, 0, 'python', 'python:keyword')),
+	('update_global', UPDATE_GLOBAL_QUERY, (1, None, 1, None, 0, 0, 0, 0, 'text')),
+)
+
 class GThemerDB:
 
 	# global_styles - List of all appropriate global styles keys that can
@@ -77,26 +356,102 @@ class GThemerDB:
 	'cursor-secondary', 'current-line', 'line-numbers', 'draw-spaces', 'bracket-match',
 	'bracket-mismatch', 'right-margin', 'search-match')
 	
-	def __init__(self, filename):
+	@instruments.timed('db.open')
+	def __init__(self, filename, languages=None, progress=None):
 		'''
 		Initialize database `filename`. Initialize the database, detect the
 		schemes from GtkSource and insert them into the database.
 		
 		*filename* (``str``) is the filename of the sqlite database.
+		
+		*languages* (``iterable``) is an optional catalog of
+			``(scheme, title, style_ids)`` tuples to seed a new database with,
+			defaults to the shared :class:`LanguageCatalog`.
+		
+		*progress* (``callable``) is optionally called while a new database
+			is seeded, see :meth:`seed`.
+		
+		An existing database is upgraded and re-synced with the installed
+		languages, see :meth:`sync`.
 		'''
 		created = os.path.exists(filename)
 		self.conn = sqlite3.connect(filename)
 		self.conn.row_factory = sqlite3.Row
 		self.cursor = self.conn.cursor()
+		# Readers don't block the writer and commits don't wait on fsync.
+		self.cursor.execute("PRAGMA journal_mode = WAL;")
+		self.cursor.execute("PRAGMA synchronous = NORMAL;")
 		if not created:
 			self.cursor.executescript(CREATE_TABLE_LANGUAGES)
 			self.cursor.executescript(CREATE_TABLE_STYLE_SCHEMES)
 			self.cursor.executescript(CREATE_TABLE_FORMATS)
 			self.cursor.executescript(CREATE_TABLE_GLOBALS)
 			self.conn.commit()
+		self._upgrade_schema()
+		if not created:
 			self._init_globals()
-			self._init_default()
-			
+			self._init_default(languages, progress=progress)
+		else:
+			self.sync(languages)
+
+	@instruments.timed('db.upgrade_schema')
+	def _upgrade_schema(self):
+		'''
+		Apply the SCHEMA_UPGRADES the database hasn't seen yet, each in its own
+		transaction, recording how long every step took in schema_version.
+		
+		Returns (``list``) the ``(version, seconds)`` of the applied upgrades.
+		'''
+		self.cursor.executescript(CREATE_TABLE_SCHEMA_VERSION)
+		version = self.schema_version()
+		if version == 0:
+			# Upgrades applied before the schema_version table existed.
+			self.cursor.execute("PRAGMA user_version;")
+			legacy = self.cursor.fetchone()[0]
+			with self.conn:
+				self.cursor.executemany("INSERT INTO schema_version (version) VALUES (?);",
+				                        [(idx,) for idx in xrange(1, legacy + 1)])
+			version = legacy
+		applied = []
+		for idx, script in enumerate(SCHEMA_UPGRADES[version:], version + 1):
+			start = time.time()
+			self.cursor.executescript("BEGIN;" + script +
+			                          "INSERT INTO schema_version (version, applied) "
+			                          "VALUES ({}, datetime('now'));COMMIT;".format(idx))
+			seconds = time.time() - start
+			with self.conn:
+				self.cursor.execute("UPDATE schema_version SET seconds = ? WHERE version = ?;", (seconds, idx))
+			applied.append((idx, seconds))
+		return applied
+
+	def schema_version(self):
+		'''
+		Returns (``int``) the number of SCHEMA_UPGRADES applied to the database.
+		'''
+		self.cursor.execute("SELECT IFNULL(MAX(version), 0) FROM schema_version;")
+		return self.cursor.fetchone()[0]
+
+	def full_scans(self):
+		'''
+		Check the ``EXPLAIN QUERY PLAN`` of each of the HOT_QUERIES.
+		
+		Returns (``list``) of ``(query, detail)`` for every step of their plans
+		that scans a whole table or index instead of searching it. Scanning
+		the rows of a subquery, which were themselves searched for, is fine.
+		'''
+		scans = []
+		for name, query, params in HOT_QUERIES:
+			self.cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+			subqueries = set()
+			for record in self.cursor.fetchall():
+				detail = record[-1]
+				words = detail.split()
+				if words[0] in ('MATERIALIZE', 'CO-ROUTINE'):
+					subqueries.add(words[-1])
+				elif words[0] == 'SCAN' and words[-1] not in subqueries:
+					scans.append((name, detail))
+		return scans
+
 	def _init_globals(self):
 		'''
 		When a new database is created, initialize the global style schemes.
@@ -104,28 +459,140 @@ class GThemerDB:
 		for style in self.global_styles:
 			self.new_global(style)
 	
-	def _init_default(self):
+	@instruments.timed('_init_default')
+	def _init_default(self, languages=None, progress=None):
 		'''
 		When a new database is created, intialize it with the styles defined in
 		GtkSource.
+		
+		*languages* (``iterable``) of ``(scheme, title, style_ids)`` tuples,
+			``None`` by default to read them from the language catalog.
+		
+		*progress* (``callable``) see :meth:`seed`.
+		'''
+		if languages is None:
+			languages = default_catalog()
+		self.seed(languages, progress=progress)
+
+	@instruments.timed('db.seed')
+	def seed(self, languages, progress=None):
 		'''
-		manager = GtkSource.LanguageManager()
-		languages = manager.get_language_ids()
-		for lang in languages:
-			lang_config = {}
-			style_ids = manager.get_language(lang).get_style_ids()
-			name = manager.get_language(lang).get_name()
-			if name == "" or style_ids == []:
-				print("**GThemer Warning: could not add language: {} with style_ids: {}".format(repr(name), repr(style_ids)))
-				continue
-			self.new_language(lang, name)
+		Bulk insert a catalog of languages and their styles, along with an
+		empty format for every style, in a single transaction.
+		
+		*languages* (``iterable``) of ``(scheme, title, style_ids)`` tuples.
+		
+		*progress* (``callable``) is optionally called as
+			``progress(scheme, done, total)`` after the styles of each language
+			are written, where *done* and *total* count styles.
+		'''
+		languages = [(scheme, title, tuple(style_ids)) for scheme, title, style_ids in languages]
+		total = sum(len(style_ids) for _, __, style_ids in languages)
+		done = 0
+		with self.conn:
+			self.cursor.executemany("INSERT INTO languages (scheme, title) VALUES (?, ?);",
+			                        [(scheme, title) for scheme, title, _ in languages])
+			self.cursor.execute("SELECT scheme, lang_seq_id FROM languages;")
+			lang_ids = {record['scheme']: record['lang_seq_id'] for record in self.cursor.fetchall()}
+			for scheme, _, style_ids in languages:
+				lang_seq_id = lang_ids[scheme]
+				self.cursor.executemany("INSERT INTO style_schemes (lang_seq_id, style) VALUES (?, ?);",
+				                        [(lang_seq_id, style) for style in style_ids])
+				done += len(style_ids)
+				if progress is not None:
+					progress(scheme, done, total)
+			self.cursor.execute("""
+			INSERT INTO formats
+				(style_seq_id)
+			SELECT style_seq_id
+				FROM style_schemes
+				WHERE style_seq_id NOT IN (SELECT style_seq_id FROM formats WHERE theme_seq_id = 0);
+			""")
+		instruments.count('db.seed.styles', total)
+
+	@instruments.timed('db.sync')
+	def sync(self, languages=None):
+		'''
+		Bring the languages and style_schemes tables in line with the installed
+		languages. Only the difference is written, in a single transaction:
+		new languages and styles are inserted with an empty format, missing
+		ones are retired and ones that come back are revived. Existing formats
+		are never touched.
+		
+		*languages* (``iterable``) of ``(scheme, title, style_ids)`` tuples,
+			defaults to the shared :class:`LanguageCatalog`.
+		
+		Returns (``tuple``) the number of ``(added, retired)`` styles.
+		'''
+		if languages is None:
+			languages = default_catalog()
+		installed = {scheme: (title, set(style_ids)) for scheme, title, style_ids in languages}
+
+		self.cursor.execute("SELECT lang_seq_id, scheme, title, retired FROM languages;")
+		known_languages = {record['scheme']: record for record in self.cursor.fetchall()}
+		self.cursor.execute("""
+		SELECT style_schemes.style_seq_id,
+		       style_schemes.style,
+		       style_schemes.retired,
+		       languages.scheme
+		FROM style_schemes
+			JOIN languages
+			ON languages.lang_seq_id = style_schemes.lang_seq_id;
+		""")
+		known_styles = {(record['scheme'], record['style']): record for record in self.cursor.fetchall()}
+
+		new_languages = []
+		update_languages = []
+		retire_languages = []
+		for scheme, (title, _) in installed.iteritems():
+			record = known_languages.get(scheme)
+			if record is None:
+				new_languages.append((scheme, title))
+			elif record['retired'] or record['title'] != title:
+				update_languages.append((title, record['lang_seq_id']))
+		for scheme, record in known_languages.iteritems():
+			if scheme not in installed and not record['retired']:
+				retire_languages.append((record['lang_seq_id'],))
+
+		new_styles = []
+		revive_styles = []
+		retire_styles = []
+		for scheme, (_, style_ids) in installed.iteritems():
 			for style in style_ids:
-				print "Adding style: {}\r".format(repr(style)), 
-				sys.stdout.flush()
-				self.new_style(lang, style)
-				self.new_format(lang, style)
-		print
-		self.conn.commit()
+				record = known_styles.get((scheme, style))
+				if record is None:
+					new_styles.append((scheme, style))
+				elif record['retired']:
+					revive_styles.append((record['style_seq_id'],))
+		for (scheme, style), record in known_styles.iteritems():
+			if not record['retired'] and style not in installed.get(scheme, ((), ()))[1]:
+				retire_styles.append((record['style_seq_id'],))
+
+		if not (new_languages or update_languages or retire_languages or
+		        new_styles or revive_styles or retire_styles):
+			return 0, 0
+
+		with self.conn:
+			self.cursor.executemany("INSERT INTO languages (scheme, title) VALUES (?, ?);", new_languages)
+			self.cursor.executemany("UPDATE languages SET title = ?, retired = 0 WHERE lang_seq_id = ?;", update_languages)
+			self.cursor.executemany("UPDATE languages SET retired = 1 WHERE lang_seq_id = ?;", retire_languages)
+			self.cursor.executemany("UPDATE style_schemes SET retired = 0 WHERE style_seq_id = ?;", revive_styles)
+			self.cursor.executemany("UPDATE style_schemes SET retired = 1 WHERE style_seq_id = ?;", retire_styles)
+			if new_styles:
+				self.cursor.execute("SELECT scheme, lang_seq_id FROM languages;")
+				lang_ids = {record['scheme']: record['lang_seq_id'] for record in self.cursor.fetchall()}
+				self.cursor.execute("SELECT IFNULL(MAX(style_seq_id), 0) FROM style_schemes;")
+				last_style_seq_id = self.cursor.fetchone()[0]
+				self.cursor.executemany("INSERT INTO style_schemes (lang_seq_id, style) VALUES (?, ?);",
+				                        [(lang_ids[scheme], style) for scheme, style in new_styles])
+				self.cursor.execute("""
+				INSERT INTO formats
+					(style_seq_id)
+				SELECT style_seq_id
+					FROM style_schemes
+					WHERE style_seq_id > ?;
+				""", (last_style_seq_id,))
+		return len(new_styles) + len(revive_styles), len(retire_styles)
 
 	def new_language(self, language, language_title):
 		'''
@@ -206,29 +673,20 @@ class GThemerDB:
 		
 		*style_name* (``str``) is the name of the style to add a format to.
 		
-		*format_config* (``dict``) is a mapping of the values to format.
+		*format_config* (``dict``) is a mapping of the values to format, only
+			the attributes it has are changed.
 		'''
-		set_clause = ""
-		for key, value in format_config.iteritems():
-			set_clause += ", {key} = {value}".format(key=key, value=repr(value))
-		set_clause = set_clause.strip().lstrip(',')
-					
-		query = """
-		UPDATE formats
-		SET {set_clause}
-		WHERE formats.style_seq_id IN (
-			SELECT DISTINCT style_schemes.style_seq_id 
-				FROM style_schemes
-				LEFT JOIN languages
-					ON languages.lang_seq_id = style_schemes.lang_seq_id
-				WHERE languages.scheme = '{lang}'
-				  AND style_schemes.style = '{style}');
-		""".format(set_clause=set_clause,
-		           lang=language,
-		           style=style_name)
-		print query
-		self.cursor.execute(query)
-		self.conn.commit()
+		self.update_formats([(language, style_name, format_config)])
+
+	def update_formats(self, many):
+		'''
+		Update the formats of many styles with one prepared statement, in a
+		single transaction.
+		
+		*many* (``iterable``) of ``(language, style_name, format_config)``
+			tuples, see :meth:`update_format`.
+		'''
+		self.apply_updates(formats=many)
 			
 	def update_global(self, scheme, global_config):
 		'''
@@ -236,69 +694,365 @@ class GThemerDB:
 		
 		*scheme* (``str``) is the global style scheme to update.
 		
-		*global_config* (``dict``) is a mapping of the global values to format.
+		*global_config* (``dict``) is a mapping of the global values to
+			format, only the attributes it has are changed.
+		'''
+		self.update_globals([(scheme, global_config)])
+
+	def update_globals(self, many):
 		'''
-		set_clause = ""
-		for key, value in global_config.iteritems():
-			set_clause += ", {key} = {value}".format(key=key, value=repr(value))
-		set_clause = set_clause.strip().lstrip(',')
+		Update many global style schemes with one prepared statement, in a
+		single transaction.
 		
-		query = """
-		UPDATE globals
-		SET {set_clause}
-		WHERE scheme = ?
-		""".format(set_clause=set_clause)
+		*many* (``iterable``) of ``(scheme, global_config)`` tuples, see
+			:meth:`update_global`.
+		'''
+		self.apply_updates(global_styles=many)
+
+	@instruments.timed('db.apply_updates')
+	def apply_updates(self, formats=(), global_styles=()):
+		'''
+		Update formats and global style schemes together, in a single
+		transaction.
 		
-		self.cursor.execute(query, (scheme,))
-		self.conn.commit()
+		*formats* (``iterable``) see :meth:`update_formats`.
 		
-	def iter_globals(self):
+		*global_styles* (``iterable``) see :meth:`update_globals`.
 		'''
-		Yield global style schemes.
+		with self.conn:
+			self.cursor.executemany(UPDATE_FORMAT_QUERY,
+			                        (_update_params(format_config) + (language, style_name)
+			                         for language, style_name, format_config in formats))
+			instruments.count('db.apply_updates.formats', self.cursor.rowcount)
+			self.cursor.executemany(UPDATE_GLOBAL_QUERY,
+			                        (_update_params(global_config) + (scheme,)
+			                         for scheme, global_config in global_styles))
+			instruments.count('db.apply_updates.globals', self.cursor.rowcount)
+		
+	@instruments.timed('db.import_themes')
+	def import_themes(self, themes):
 		'''
-		query = "SELECT * FROM globals"
-		self.cursor.execute(query)
-		for record in self.cursor.fetchall():
-			yield dict(zip(record.keys(), record))
+		Store parsed style schemes as themes, next to the styles being edited,
+		in a single transaction. A theme imported from the same file again
+		replaces the previous import, themes saved with :meth:`save_theme`
+		are never touched.
+		
+		*themes* (``iterable``) of ``(filename, info, styles)`` tuples, where
+			*info* and *styles* are what :meth:`StyleGenerator.parse_file`
+			returns.
+		
+		Returns (``list``) the number of styles of each theme that are not
+		defined in the database and were skipped.
+		'''
+		self.cursor.execute("SELECT style, style_seq_id FROM style_schemes;")
+		style_ids = {record['style']: record['style_seq_id'] for record in self.cursor.fetchall()}
+		skipped = []
+		with self.conn:
+			for filename, info, styles in themes:
+				theme = (info['id'], info['name'], info['author'], info['version'], info['description'])
+				self.cursor.execute("SELECT theme_seq_id FROM themes WHERE source = ?;", (filename,))
+				record = self.cursor.fetchone()
+				if record is None:
+					self.cursor.execute("""
+					INSERT INTO themes
+						(scheme_id, name, author, version, description, filename, source)
+					VALUES (?, ?, ?, ?, ?, ?, ?);
+					""", theme + (filename, filename))
+					theme_seq_id = self.cursor.lastrowid
+				else:
+					theme_seq_id = record['theme_seq_id']
+					self.cursor.execute("""
+					UPDATE themes
+					SET scheme_id = ?, name = ?, author = ?, version = ?, description = ?
+					WHERE theme_seq_id = ?;
+					""", theme + (theme_seq_id,))
+					self.cursor.execute("DELETE FROM formats WHERE theme_seq_id = ?;", (theme_seq_id,))
+					self.cursor.execute("DELETE FROM globals WHERE theme_seq_id = ?;", (theme_seq_id,))
+				format_rows = []
+				global_rows = []
+				missing = 0
+				for language, config in styles.iteritems():
+					if language == '__globals':
+						for style, attrs in config.iteritems():
+							global_rows.append((theme_seq_id, style) + _format_values(attrs))
+						continue
+					for style, attrs in config['styles'].iteritems():
+						if style not in style_ids:
+							missing += 1
+							continue
+						format_rows.append((theme_seq_id, style_ids[style]) + _format_values(attrs))
+				self.cursor.executemany("""
+				INSERT INTO formats
+					(theme_seq_id, style_seq_id, foreground, background, flags_set, flags)
+				VALUES (?, ?, ?, ?, ?, ?);
+				""", format_rows)
+				self.cursor.executemany("""
+				INSERT INTO globals
+					(theme_seq_id, scheme, foreground, background, flags_set, flags)
+				VALUES (?, ?, ?, ?, ?, ?);
+				""", global_rows)
+				skipped.append(missing)
+		return skipped
+
+	def iter_globals(self, theme=0):
+		'''
+		Yield global style schemes as ``sqlite3.Row`` records of ``scheme``,
+		``background``, ``foreground`` and the ``flags_set``/``flags`` pair,
+		see :func:`lib.styles.unpack_flag_pair`.
+		
+		*theme* (``int``) is the theme_seq_id of the theme to read, the theme
+			being edited by default.
+		'''
+		return self._stream(ITER_GLOBALS_QUERY, (theme,))
 
-	def iter_styles(self, language=None):
+	def iter_styles(self, language=None, theme=0, after=None, limit=None):
 		'''
-		Yield styles, optionally filtering for a specific language
+		Yield styles as ``sqlite3.Row`` records of ``style``, ``foreground``,
+		``background`` and the ``flags_set``/``flags`` pair, see
+		:func:`lib.styles.unpack_flag_pair`, optionally filtering for a
+		specific language.
 		
 		*language* (``str``) is the language to filter.
+		
+		*theme* (``int``) is the theme_seq_id of the theme to read, the theme
+			being edited by default. Stored themes only have formats for the
+			styles they set.
+		
+		*after* (``str``) and *limit* (``int``) page through the styles in
+			order of their name: only the first *limit* styles named after
+			*after* are yielded. Pass the name of the last style of a page as
+			*after* to get the next one.
 		'''
-		where_clause = "WHERE languages.scheme = {}".format(repr(language)) if language is not None else ""
-		query = """
-		SELECT  style_schemes.style,
-	 			formats.foreground,
-	 			formats.background,
-	 			formats.bold,
-	 			formats.italic,
-	 			formats.strikethrough,
-	 			formats.underline
-		FROM formats
-			LEFT JOIN style_schemes
-			ON style_schemes.style_seq_id = formats.style_seq_id
-			LEFT JOIN languages
-			ON style_schemes.lang_seq_id = languages.lang_seq_id
-		{where_clause}
-		""".format(where_clause=where_clause)
+		if after is None and limit is None:
+			if language is None:
+				return self._stream(ITER_STYLES_QUERY, (theme,))
+			return self._stream(ITER_LANGUAGE_STYLES_QUERY, (language, theme))
+		page = (after or '', -1 if limit is None else limit)
+		if language is None:
+			return self._stream(ITER_STYLES_PAGE_QUERY, (theme,) + page)
+		return self._stream(ITER_LANGUAGE_STYLES_PAGE_QUERY, (language, theme) + page)
+
+	def iter_scheme_styles(self, theme=0):
+		'''
+		Yield the global styles and then the styles of *theme* that have at
+		least one attribute set, each in order of their name, as ``(name,
+		config)`` tuples ready for :meth:`StyleGenerator.add_style`. The
+		styles are streamed from the database, see :meth:`_stream`.
+		'''
+		global_records = sorted(self.iter_globals(theme=theme), key=lambda record: record['scheme'])
+		for record in global_records:
+			config = _record_config(record)
+			if any(value is not None for value in config.itervalues()):
+				yield record['scheme'], config
+		for record in self.iter_styles(theme=theme, after=''):
+			config = _record_config(record)
+			if any(value is not None for value in config.itervalues()):
+				yield record['style'], config
+
+	def iter_themes(self):
+		'''
+		Yield the stored themes as ``sqlite3.Row`` records of
+		``theme_seq_id``, ``scheme_id``, ``name``, ``author``, ``version``,
+		``description`` and ``filename``.
+		'''
+		return self._stream("""
+		SELECT theme_seq_id, scheme_id, name, author, version, description, filename
+		FROM themes
+		ORDER BY name;
+		""")
+
+	def find_theme(self, name):
+		'''
+		Returns (``int``) the theme_seq_id of the most recent theme called
+		*name*, ``None`` if there is none.
+		'''
+		self.cursor.execute("SELECT MAX(theme_seq_id) FROM themes WHERE name = ?;", (name,))
+		return self.cursor.fetchone()[0]
+
+	@instruments.timed('db.save_theme')
+	def save_theme(self, info, filename=None, replace=False):
+		'''
+		Store a copy of the theme being edited as a new theme, keeping only the
+		styles that have something set.
 		
-		self.cursor.execute(query)
-		for record in self.cursor.fetchall():
-			yield dict(zip(record.keys(), record))
+		*info* (``dict``) with the ``id``, ``name``, ``author``, ``version``
+			and ``description`` of the theme.
+		
+		*filename* (``str``) the theme is saved to, optional. Any number of
+			themes can be saved to the same file.
+		
+		*replace* (``bool``) overwrites the most recent theme saved to
+			*filename*, keeping its theme_seq_id, instead of adding one. A new
+			theme is added if there is none. Imported themes are never
+			replaced.
+		
+		Returns (``int``) the theme_seq_id of the new or replaced theme.
+		'''
+		theme = (info.get('id'), info.get('name'), info.get('author'),
+		         info.get('version'), info.get('description'))
+		with self.conn:
+			theme_seq_id = None
+			if replace and filename is not None:
+				self.cursor.execute("""
+				SELECT MAX(theme_seq_id) FROM themes
+				WHERE filename = ? AND source IS NULL;
+				""", (filename,))
+				theme_seq_id = self.cursor.fetchone()[0]
+			if theme_seq_id is None:
+				self.cursor.execute("""
+				INSERT INTO themes
+					(scheme_id, name, author, version, description, filename)
+				VALUES (?, ?, ?, ?, ?, ?);
+				""", theme + (filename,))
+				theme_seq_id = self.cursor.lastrowid
+			else:
+				self.cursor.execute("""
+				UPDATE themes
+				SET scheme_id = ?, name = ?, author = ?, version = ?, description = ?
+				WHERE theme_seq_id = ?;
+				""", theme + (theme_seq_id,))
+				self.cursor.execute("DELETE FROM formats WHERE theme_seq_id = ?;", (theme_seq_id,))
+				self.cursor.execute("DELETE FROM globals WHERE theme_seq_id = ?;", (theme_seq_id,))
+			self.cursor.execute("""
+			INSERT INTO formats
+				(theme_seq_id, style_seq_id, foreground, background, flags_set, flags)
+			SELECT ?, style_seq_id, foreground, background, flags_set, flags
+				FROM formats
+				WHERE theme_seq_id = 0
+				  AND (foreground IS NOT NULL OR background IS NOT NULL OR flags_set != 0);
+			""", (theme_seq_id,))
+			self.cursor.execute("""
+			INSERT INTO globals
+				(theme_seq_id, scheme, foreground, background, flags_set, flags)
+			SELECT ?, scheme, foreground, background, flags_set, flags
+				FROM globals
+				WHERE theme_seq_id = 0
+				  AND (foreground IS NOT NULL OR background IS NOT NULL OR flags_set != 0);
+			""", (theme_seq_id,))
+		return theme_seq_id
+
+	@instruments.timed('db.switch_theme')
+	def switch_theme(self, theme):
+		'''
+		Replace the theme being edited with a copy of stored theme *theme*, in
+		a single transaction. Styles the stored theme doesn't set are unset.
+		
+		*theme* (``int``) is the theme_seq_id of the theme to edit.
+		'''
+		with self.conn:
+			self.cursor.execute("""
+			UPDATE formats
+			SET foreground = NULL, background = NULL, flags_set = 0, flags = 0
+			WHERE theme_seq_id = 0;
+			""")
+			self.cursor.execute("""
+			INSERT OR REPLACE INTO formats
+				(theme_seq_id, style_seq_id, foreground, background, flags_set, flags)
+			SELECT 0, style_seq_id, foreground, background, flags_set, flags
+				FROM formats
+				WHERE theme_seq_id = ?;
+			""", (theme,))
+			self.cursor.execute("""
+			UPDATE globals
+			SET foreground = NULL, background = NULL, flags_set = 0, flags = 0
+			WHERE theme_seq_id = 0;
+			""")
+			self.cursor.execute("""
+			INSERT OR REPLACE INTO globals
+				(theme_seq_id, scheme, foreground, background, flags_set, flags)
+			SELECT 0, scheme, foreground, background, flags_set, flags
+				FROM globals
+				WHERE theme_seq_id = ?;
+			""", (theme,))
+
+	def delete_theme(self, theme):
+		'''
+		Delete stored theme *theme* with its formats and globals.
+		'''
+		if not theme:
+			raise ValueError("the theme being edited can't be deleted")
+		with self.conn:
+			self.cursor.execute("DELETE FROM formats WHERE theme_seq_id = ?;", (theme,))
+			self.cursor.execute("DELETE FROM globals WHERE theme_seq_id = ?;", (theme,))
+			self.cursor.execute("DELETE FROM themes WHERE theme_seq_id = ?;", (theme,))
+
+	@instruments.timed('db.diff_themes')
+	def diff_themes(self, theme_a, theme_b):
+		'''
+		Compare two themes in SQL.
+		
+		*theme_a* (``int``) and *theme_b* (``int``) are theme_seq_ids, 0 is
+			the theme being edited.
+		
+		Yields ``sqlite3.Row`` records of the styles, then the global styles,
+		that differ, with their ``style`` name and ``foreground_a``,
+		``background_a``, ``flags_set_a``, ``flags_a`` and the same ``_b``
+		columns.
+		'''
+		params = {'a': theme_a, 'b': theme_b}
+		for query in (DIFF_FORMATS_QUERY, DIFF_GLOBALS_QUERY):
+			for record in self._stream(query, params):
+				yield record
 
 	def iter_languages(self):
 		'''
 		Yield languages and their proper names
 		'''
-		query = """SELECT scheme, 
-						  title 
-				   FROM languages;"""
-		self.cursor.execute(query)
-		for record in self.cursor.fetchall():
+		for record in self._stream(ITER_LANGUAGES_QUERY):
 			yield (record['scheme'], record['title'])
 
+	def _stream(self, query, params=()):
+		'''
+		Yield the records of *query* in batches of FETCH_SIZE, from a cursor of
+		its own so iterators can be nested and interleaved with other calls.
+		The iterator must be exhausted or closed before the next commit.
+		'''
+		cursor = self.conn.cursor()
+		try:
+			with instruments.span('db.stream'):
+				cursor.execute(query, params)
+			while True:
+				records = cursor.fetchmany(FETCH_SIZE)
+				if not records:
+					break
+				instruments.count('db.stream.rows', len(records))
+				for record in records:
+					yield record
+		finally:
+			cursor.close()
+
+
+def _format_values(attrs):
+	'''
+	Convert parsed <style> attributes to ``(foreground, background,
+	flags_set, flags)`` column values.
+	'''
+	return (attrs.get('foreground'), attrs.get('background')) + pack_flag_pair(attrs)
+
+def _record_config(record):
+	'''
+	Returns (``dict``) the attributes of a style or global *record* with
+	their flags unpacked.
+	'''
+	config = unpack_flag_pair(record['flags_set'], record['flags'])
+	config['foreground'] = record['foreground']
+	config['background'] = record['background']
+	return config
+
+def _update_params(config):
+	'''
+	Returns the parameters of UPDATE_SET_CLAUSE setting the attributes of
+	*config*, attributes it doesn't have are left as they are.
+	'''
+	mask = 0
+	for key, bit in FLAG_BITS:
+		if key in config:
+			mask |= bit
+	flags_set, flags = pack_flag_pair(config)
+	return ('foreground' in config, config.get('foreground'),
+	        'background' in config, config.get('background'),
+	        ~mask, flags_set, ~mask, flags)
+
 
 if __name__ == '__main__':
 	db = GThemerDB('test.db')
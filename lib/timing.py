@@ -0,0 +1,210 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Timing helpers for finding out where GThemer spends its time.
+
+Set the GTHEMER_TIMING environment variable to print a report of the
+startup phases and of the spans and counters of :data:`instruments` to
+stderr, and GTHEMER_TIMING_JSON to a filename to dump a JSON summary of
+the session there when it ends.
+"""
+
+import os
+import sys
+import time
+
+class PhaseTimer:
+	'''
+	Records the time at which each named phase of a process finished.
+	'''
+
+	def __init__(self, start=None, enabled=None):
+		'''
+		*start* (``float``) is the ``time.time()`` the process started at,
+			defaults to now.
+
+		*enabled* (``bool``) defaults to whether GTHEMER_TIMING is set.
+		'''
+		self.start = start if start is not None else time.time()
+		self.enabled = enabled if enabled is not None else bool(os.environ.get('GTHEMER_TIMING'))
+		self.phases = []
+
+	def mark(self, phase):
+		'''
+		Record that *phase* just finished.
+		'''
+		if self.enabled:
+			self.phases.append((phase, time.time()))
+
+	def report(self, stream=None):
+		'''
+		Write how long each phase took, and since the start, to *stream*.
+		'''
+		if not self.enabled:
+			return
+		stream = stream or sys.stderr
+		previous = self.start
+		for phase, when in self.phases:
+			stream.write("{:>8.1f}ms {:>8.1f}ms  {}\n".format((when - previous) * 1000, (when - self.start) * 1000, phase))
+			previous = when
+
+
+class _Span(object):
+	'''
+	Times one run of a named span of :class:`Instruments`.
+	'''
+	__slots__ = ('instruments', 'name', 'start')
+
+	def __init__(self, instruments, name):
+		self.instruments = instruments
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.time()
+		return self
+
+	def __exit__(self, *exc_info):
+		self.instruments.add_time(self.name, time.time() - self.start)
+		return False
+
+
+class _NoSpan(object):
+	'''
+	Stands in for a _Span while instrumentation is disabled.
+	'''
+	__slots__ = ()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		return False
+
+_no_span = _NoSpan()
+
+
+class Instruments:
+	'''
+	Named timing spans and counters, quiet and nearly free unless enabled.
+	'''
+
+	def __init__(self, enabled=None):
+		'''
+		*enabled* (``bool``) defaults to whether GTHEMER_TIMING or
+			GTHEMER_TIMING_JSON is set.
+		'''
+		if enabled is None:
+			enabled = bool(os.environ.get('GTHEMER_TIMING') or os.environ.get('GTHEMER_TIMING_JSON'))
+		self.enabled = enabled
+		self.reset()
+
+	def reset(self):
+		'''
+		Forget every span and counter recorded so far.
+		'''
+		self.start = time.time()
+		# spans - mapping of span names to ``[calls, total, longest]`` seconds.
+		self.spans = {}
+		self.counters = {}
+
+	def span(self, name):
+		'''
+		Returns a context manager timing the code it wraps as a run of span
+		*name*::
+
+			with instruments.span('parse_file'):
+				...
+		'''
+		if not self.enabled:
+			return _no_span
+		return _Span(self, name)
+
+	def timed(self, name):
+		'''
+		Decorator timing every call of the function as a run of span *name*.
+		'''
+		def decorator(function):
+			def wrapper(*args, **kwargs):
+				if not self.enabled:
+					return function(*args, **kwargs)
+				with _Span(self, name):
+					return function(*args, **kwargs)
+			wrapper.__name__ = function.__name__
+			wrapper.__doc__ = function.__doc__
+			return wrapper
+		return decorator
+
+	def add_time(self, name, seconds):
+		'''
+		Record a run of span *name* that took *seconds*.
+		'''
+		record = self.spans.get(name)
+		if record is None:
+			self.spans[name] = [1, seconds, seconds]
+		else:
+			record[0] += 1
+			record[1] += seconds
+			if seconds > record[2]:
+				record[2] = seconds
+
+	def count(self, name, amount=1):
+		'''
+		Add *amount* to counter *name*.
+		'''
+		if self.enabled:
+			self.counters[name] = self.counters.get(name, 0) + amount
+
+	def summary(self):
+		'''
+		Returns (``dict``) the ``duration`` of the session so far, and the
+		``calls``, ``total``, ``mean`` and ``max`` time of every span and the
+		value of every counter. Times are in milliseconds.
+		'''
+		return {
+			'started': self.start,
+			'duration': (time.time() - self.start) * 1000,
+			'spans': {name: {
+				'calls': calls,
+				'total': total * 1000,
+				'mean': total * 1000 / calls,
+				'max': longest * 1000,
+			} for name, (calls, total, longest) in self.spans.iteritems()},
+			'counters': dict(self.counters),
+		}
+
+	def report(self, stream=None):
+		'''
+		Write the spans, longest total first, and the counters to *stream*.
+		'''
+		if not self.enabled:
+			return
+		stream = stream or sys.stderr
+		summary = self.summary()
+		for name, span in sorted(summary['spans'].iteritems(), key=lambda item: -item[1]['total']):
+			stream.write("{:>10.1f}ms {:>6} calls {:>8.1f}ms max  {}\n".format(span['total'], span['calls'], span['max'], name))
+		for name, value in sorted(summary['counters'].iteritems()):
+			stream.write("{:>10}  {}\n".format(value, name))
+
+	def dump(self, filename):
+		'''
+		Write the :meth:`summary` to *filename* as JSON.
+		'''
+		import json
+		with open(filename, 'w') as fp:
+			json.dump(self.summary(), fp, indent=1, sort_keys=True)
+
+# instruments - The instrumentation shared by the whole session.
+instruments = Instruments()
@@ -0,0 +1,131 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Write-behind queue for the edits made in the styles tree.
+
+Edits are kept in memory, coalesced per style, and written to the GThemerDB
+in one transaction shortly after the first pending edit instead of
+committing on every click.
+
+The queue counts the ``write_queue.edits`` it was given, how many of them were
+``write_queue.coalesced`` into a pending one, its ``write_queue.flushes``, the
+styles ``write_queue.written`` by them, so the depth of the queue at each
+flush, and its ``write_queue.failed_flushes``. The ``write_queue.flush`` span
+times the flushes. See :mod:`lib.timing`.
+"""
+
+from lib.timing import instruments
+
+class WriteBehindQueue:
+	'''
+	Coalesces style edits and flushes them to a GThemerDB in batches.
+	'''
+
+	# globals_key - The language the edits of global styles are queued under.
+	globals_key = "__globals"
+
+	def __init__(self, db, delay=500, schedule=None, unschedule=None):
+		'''
+		*db* (``GThemerDB``) the edits are written to.
+
+		*delay* (``int``) is how many milliseconds after the first pending
+			edit the queue is flushed.
+
+		*schedule* (``callable``) is called as ``schedule(delay, callback)``
+			to run the flush later and returns a source id, defaults to
+			``GLib.timeout_add``.
+
+		*unschedule* (``callable``) cancels a scheduled flush given its source
+			id, defaults to ``GLib.source_remove``.
+		'''
+		if schedule is None or unschedule is None:
+			from gi.repository import GLib
+			schedule = schedule or GLib.timeout_add
+			unschedule = unschedule or GLib.source_remove
+		self.db = db
+		self.delay = delay
+		self.schedule = schedule
+		self.unschedule = unschedule
+		self.source_id = None
+		# pending - mapping of ``(language, style)`` to the attributes to write.
+		self.pending = {}
+
+	def __len__(self):
+		return len(self.pending)
+
+	def put_format(self, language, style_name, config):
+		'''
+		Queue an update of the format of *style_name* of *language*, see
+		:meth:`GThemerDB.update_format`. Later edits of the same style
+		override the attributes they share with earlier ones.
+		'''
+		self._put((language, style_name), config)
+
+	def put_global(self, scheme, config):
+		'''
+		Queue an update of the global style *scheme*, see
+		:meth:`GThemerDB.update_global`.
+		'''
+		self._put((self.globals_key, scheme), config)
+
+	def _put(self, key, config):
+		instruments.count('write_queue.edits')
+		if key in self.pending:
+			instruments.count('write_queue.coalesced')
+			self.pending[key].update(config)
+		else:
+			self.pending[key] = dict(config)
+		if self.source_id is None:
+			self.source_id = self.schedule(self.delay, self._on_timeout)
+
+	def _on_timeout(self):
+		self.source_id = None
+		self.flush()
+		return False
+
+	def flush(self):
+		'''
+		Write every pending edit in a single transaction. If it fails the
+		edits stay pending, another flush is scheduled and the error is
+		raised.
+
+		Returns (``int``) the number of styles written.
+		'''
+		if self.source_id is not None:
+			self.unschedule(self.source_id)
+			self.source_id = None
+		if not self.pending:
+			return 0
+		pending = self.pending
+		formats = []
+		global_styles = []
+		for (language, style_name), config in pending.iteritems():
+			if language == self.globals_key:
+				global_styles.append((style_name, config))
+			else:
+				formats.append((language, style_name, config))
+		try:
+			with instruments.span('write_queue.flush'):
+				self.db.apply_updates(formats, global_styles)
+		except Exception:
+			instruments.count('write_queue.failed_flushes')
+			# Try again later, unless the next edit does first.
+			self.source_id = self.schedule(self.delay, self._on_timeout)
+			raise
+		self.pending = {}
+		instruments.count('write_queue.flushes')
+		instruments.count('write_queue.written', len(pending))
+		return len(pending)
@@ -0,0 +1,106 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Run the command line interface in a child process where ``gi`` can't be
+imported, the way it runs on a machine without Gtk.
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lib.language_catalog import LanguageCatalog, xdg_search_path
+from lib.style_generator import StyleGenerator
+
+# RUN_WITHOUT_GI - Runs lib.cli.main on sys.argv with gi made unimportable.
+RUN_WITHOUT_GI = "import sys; sys.modules['gi'] = None; from lib.cli import main; sys.exit(main(sys.argv[1:]))"
+
+# LANGUAGES - The catalog the snapshot of the tests lists.
+LANGUAGES = [("c", "C", ("c:comment", "c:keyword"))]
+
+class CLIWithoutGiTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix="gthemer-test-")
+		self.environ = dict(os.environ)
+		os.environ['HOME'] = self.directory
+		os.environ['XDG_DATA_HOME'] = os.path.join(self.directory, "data")
+		os.environ['XDG_DATA_DIRS'] = os.path.join(self.directory, "system")
+		self.snapshot = os.path.join(self.directory, ".gthemer", "languages.snapshot")
+		self.db = os.path.join(self.directory, "test.db")
+
+	def tearDown(self):
+		os.environ.clear()
+		os.environ.update(self.environ)
+		shutil.rmtree(self.directory)
+
+	def write_snapshot(self):
+		LanguageCatalog(path=self.snapshot)._write_snapshot(xdg_search_path(), LANGUAGES)
+
+	def write_scheme(self, styles):
+		filename = os.path.join(self.directory, "scheme.xml")
+		generator = StyleGenerator()
+		generator.add_info("test", "Test", version="1.0")
+		for name, config in styles:
+			generator.add_style(name, config)
+		generator.save_file(filename)
+		return filename
+
+	def gthemer(self, *args):
+		process = subprocess.Popen([sys.executable, '-c', RUN_WITHOUT_GI] + list(args), cwd=ROOT,
+		                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		out, err = process.communicate()
+		return process.returncode, out, err
+
+	def test_validate(self):
+		self.write_snapshot()
+		scheme = self.write_scheme([("c:comment", {'foreground': "#808080"})])
+		status, out, err = self.gthemer('validate', scheme)
+		self.assertEqual((status, err), (0, ""))
+		self.assertIn("ok", out)
+
+	def test_validate_reports_unknown_styles(self):
+		self.write_snapshot()
+		scheme = self.write_scheme([("c:string", {'foreground': "#808080"})])
+		status, out, err = self.gthemer('validate', scheme)
+		self.assertEqual(status, 1)
+		self.assertIn("unknown style 'c:string'", out)
+
+	def test_build(self):
+		self.write_snapshot()
+		output = os.path.join(self.directory, "out.xml")
+		status, out, err = self.gthemer('--db', self.db, 'build', output)
+		self.assertEqual((status, err), (0, ""))
+		self.assertTrue(os.path.exists(output))
+
+	def test_no_snapshot(self):
+		scheme = self.write_scheme([("c:comment", {'foreground': "#808080"})])
+		status, out, err = self.gthemer('validate', scheme)
+		self.assertEqual(status, 1)
+		self.assertIn("GtkSource can't be imported", err)
+		self.assertNotIn("Traceback", err)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,110 @@
+#encoding: utf-8
+#    This file is part of GThemer.
+#
+#    GThemer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    GThemer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Saving and importing themes in GThemerDB.
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.stylesdb import GThemerDB
+
+# LANGUAGES - The catalog the database is seeded with.
+LANGUAGES = [("c", "C", ("c:comment", "c:keyword"))]
+
+# FILENAME - The file the themes are saved to and imported from.
+FILENAME = "/schemes/test.xml"
+
+def scheme_info(name):
+	return {'id': name.lower(), 'name': name, 'author': None, 'version': "1.0", 'description': None}
+
+def scheme_styles(foreground):
+	return {'c': {'styles': {'c:comment': {'foreground': foreground, 'background': None, 'bold': None,
+	                                       'italic': None, 'underline': None, 'strikethrough': None}}}}
+
+class ThemesTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix="gthemer-test-")
+		self.db = GThemerDB(os.path.join(self.directory, "test.db"), languages=LANGUAGES)
+
+	def tearDown(self):
+		self.db.conn.close()
+		shutil.rmtree(self.directory)
+
+	def edit(self, foreground):
+		self.db.update_format('c', 'c:comment', {'foreground': foreground})
+
+	def comment_foreground(self, theme):
+		for record in self.db.iter_styles(language='c', theme=theme):
+			if record['style'] == 'c:comment':
+				return record['foreground']
+
+	def themes(self):
+		return dict((record['theme_seq_id'], record['name']) for record in self.db.iter_themes())
+
+	def test_save_twice_to_one_file(self):
+		self.edit("#111111")
+		first = self.db.save_theme(scheme_info("First"), filename=FILENAME)
+		self.edit("#222222")
+		second = self.db.save_theme(scheme_info("Second"), filename=FILENAME)
+		self.assertNotEqual(first, second)
+		self.assertEqual(self.themes(), {first: "First", second: "Second"})
+		self.assertEqual(self.comment_foreground(first), "#111111")
+		self.assertEqual(self.comment_foreground(second), "#222222")
+
+	def test_save_replace(self):
+		self.edit("#111111")
+		first = self.db.save_theme(scheme_info("First"), filename=FILENAME)
+		self.edit("#222222")
+		replaced = self.db.save_theme(scheme_info("Replaced"), filename=FILENAME, replace=True)
+		self.assertEqual(replaced, first)
+		self.assertEqual(self.themes(), {first: "Replaced"})
+		self.assertEqual(self.comment_foreground(first), "#222222")
+
+	def test_save_replace_without_a_saved_theme(self):
+		self.db.import_themes([(FILENAME, scheme_info("Imported"), scheme_styles("#333333"))])
+		imported = self.db.find_theme("Imported")
+		saved = self.db.save_theme(scheme_info("Saved"), filename=FILENAME, replace=True)
+		self.assertNotEqual(saved, imported)
+		self.assertEqual(self.comment_foreground(imported), "#333333")
+
+	def test_import_keeps_saved_theme(self):
+		self.edit("#111111")
+		saved = self.db.save_theme(scheme_info("Saved"), filename=FILENAME)
+		self.db.import_themes([(FILENAME, scheme_info("Imported"), scheme_styles("#333333"))])
+		imported = self.db.find_theme("Imported")
+		self.assertNotEqual(saved, imported)
+		self.assertEqual(self.themes(), {saved: "Saved", imported: "Imported"})
+		self.assertEqual(self.comment_foreground(saved), "#111111")
+
+	def test_import_again_replaces_import(self):
+		self.db.import_themes([(FILENAME, scheme_info("Imported"), scheme_styles("#333333"))])
+		imported = self.db.find_theme("Imported")
+		self.db.import_themes([(FILENAME, scheme_info("Again"), scheme_styles("#444444"))])
+		self.assertEqual(self.themes(), {imported: "Again"})
+		self.assertEqual(self.comment_foreground(imported), "#444444")
+
+
+if __name__ == '__main__':
+	unittest.main()